@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from contextlib import closing
+from typing import NamedTuple
+import numpy as np
+import metrics
+from topic_packs import read_corpus_version
+from sqlite_store import CACHE_DIR, connect, create_tables, normalize
+
+
+ANSWER_CACHE_PATH = os.path.join(CACHE_DIR, "answers.sqlite3")
+# Cosine similarity above which a new question counts as a paraphrase of a
+# cached one.
+SIMILARITY_THRESHOLD = float(os.environ.get("ANSWER_CACHE_THRESHOLD", 0.92))
+TTL = float(os.environ.get("ANSWER_CACHE_TTL", 7 * 24 * 3600))
+MAX_ENTRIES = int(os.environ.get("ANSWER_CACHE_MAX_ENTRIES", 5000))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS answers (
+    id INTEGER PRIMARY KEY,
+    namespace TEXT NOT NULL,
+    question TEXT NOT NULL,
+    embedding BLOB NOT NULL,
+    answer TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS answers_by_namespace ON answers (namespace);
+CREATE INDEX IF NOT EXISTS answers_by_last_used ON answers (last_used);
+"""
+
+
+class CachedAnswer(NamedTuple):
+    answer: str
+    question: str
+    similarity: float
+
+
+class AnswerCache:
+    """Q&A answers looked up by the meaning of the question.
+
+    Entries are namespaced by model name and corpus version, so a new
+    model or a re-ingested corpus starts from an empty cache. Questions
+    are compared by the cosine similarity of their embeddings against an
+    in-memory matrix of the namespace, reloaded whenever another process
+    adds or evicts entries. Entries expire after `ttl` seconds and the
+    least recently used are evicted beyond `max_entries`.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        model: str,
+        path: str = ANSWER_CACHE_PATH,
+        threshold: float = SIMILARITY_THRESHOLD,
+        ttl: float = TTL,
+        max_entries: int = MAX_ENTRIES,
+    ):
+        self.embeddings = embeddings
+        self.model = model
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._loaded = {}
+        create_tables(path, SCHEMA)
+
+    def namespace(self) -> str:
+        return f"{self.model}@{read_corpus_version() or 'unversioned'}"
+
+    def _entries(self, conn, namespace: str):
+        # (ids, matrix) for the namespace, re-read only when its rows change.
+        state = conn.execute(
+            "SELECT COUNT(*), MAX(id) FROM answers WHERE namespace = ?", (namespace,)
+        ).fetchone()
+        with self._lock:
+            loaded = self._loaded.get(namespace)
+            if loaded is not None and loaded[0] == state:
+                return loaded[1], loaded[2]
+        rows = conn.execute(
+            "SELECT id, embedding FROM answers WHERE namespace = ?", (namespace,)
+        ).fetchall()
+        ids = [row_id for row_id, _embedding in rows]
+        if rows:
+            matrix = np.stack([np.frombuffer(embedding, dtype=np.float32) for _id, embedding in rows])
+        else:
+            matrix = np.empty((0, 0), dtype=np.float32)
+        with self._lock:
+            self._loaded = {namespace: (state, ids, matrix)}
+        return ids, matrix
+
+    def lookup(self, question: str):
+        """The cached answer to the closest earlier question, or None"""
+        try:
+            vector = normalize(self.embeddings.embed_query(question))
+        except Exception:
+            # No embeddings, no cache: the caller asks the model as usual.
+            metrics.increment("answer_cache.error")
+            return None
+        namespace = self.namespace()
+        with closing(connect(self.path)) as conn:
+            ids, matrix = self._entries(conn, namespace)
+            if ids and matrix.shape[1] == vector.shape[0]:
+                similarities = matrix @ vector
+                best = int(np.argmax(similarities))
+                if similarities[best] >= self.threshold:
+                    row = conn.execute(
+                        "SELECT question, answer, created_at FROM answers WHERE id = ?",
+                        (ids[best],),
+                    ).fetchone()
+                    now = time.time()
+                    if row is not None and now - row[2] < self.ttl:
+                        conn.execute("UPDATE answers SET last_used = ? WHERE id = ?", (now, ids[best]))
+                        metrics.increment("answer_cache.hit")
+                        return CachedAnswer(row[1], row[0], float(similarities[best]))
+        metrics.increment("answer_cache.miss")
+        return None
+
+    def store(self, question: str, answer: str):
+        if not answer.strip():
+            return
+        try:
+            vector = normalize(self.embeddings.embed_query(question))
+        except Exception:
+            metrics.increment("answer_cache.error")
+            return
+        now = time.time()
+        with closing(connect(self.path)) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO answers (namespace, question, embedding, answer, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (self.namespace(), question, vector.tobytes(), answer, now, now),
+            )
+            self._evict(conn, now)
+            conn.execute("COMMIT")
+
+    def _evict(self, conn, now: float):
+        expired = conn.execute("DELETE FROM answers WHERE created_at < ?", (now - self.ttl,)).rowcount
+        overflow = conn.execute(
+            "DELETE FROM answers WHERE id IN "
+            "(SELECT id FROM answers ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        ).rowcount
+        if expired + overflow:
+            metrics.increment("answer_cache.evicted", expired + overflow)
+
+    def __len__(self):
+        with closing(connect(self.path)) as conn:
+            return conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0]
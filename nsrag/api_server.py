@@ -0,0 +1,306 @@
+import argparse
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+import uvicorn
+from fastapi import FastAPI, HTTPException, Query, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
+from pydantic import BaseModel
+import metrics
+from engine import ADAPTIVE, QUIZ_TYPES, create_engine
+from history_store import ALL_USERS, ROLLUP_DIMENSIONS
+from llm_scheduler import SchedulerOverloaded
+from quiz_generator import MODEL_NAME
+from quiz_jobs import DONE, QuizJobs
+from quiz_pool import DIFFICULTIES
+from quiz_store import QuizStore
+from topics import TOPICS
+
+
+NSRAG_DIR = os.path.dirname(os.path.abspath(__file__))
+CORS_ORIGINS = os.environ.get(
+    "API_CORS_ORIGINS", "http://localhost:3000,http://127.0.0.1:3000"
+).split(",")
+
+# Created once per worker process at startup and shared by all requests.
+state = {}
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Warm-up opens the vector store and keyword index before the first request.
+    state["engine"] = await asyncio.to_thread(create_engine)
+    state["store"] = QuizStore()
+    state["jobs"] = QuizJobs(state["engine"], state["store"])
+    state["history"] = state["engine"].history
+    yield
+    state.clear()
+
+
+app = FastAPI(title="QuizBot API", lifespan=lifespan)
+app.add_middleware(CORSMiddleware, allow_origins=CORS_ORIGINS, allow_methods=["*"], allow_headers=["*"])
+
+
+@app.exception_handler(SchedulerOverloaded)
+async def overloaded_handler(request: Request, exc: SchedulerOverloaded):
+    return JSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "10"})
+
+
+class GradeRequest(BaseModel):
+    quiz_id: str
+    # Question index (from 0) to the chosen option letter, or "True"/"False".
+    answers: dict[int, str]
+    # Given a user id, the graded quiz is added to that user's history.
+    user_id: Optional[str] = None
+    time_taken: Optional[int] = None
+
+
+class QuizJobRequest(BaseModel):
+    quiz_type: str = "mcq"
+    topics: Optional[list[str]] = None
+    num_questions: int = 5
+    difficulty: str = "Medium"
+    # Without one, the quiz is not tracked: nothing is marked as seen.
+    user_id: Optional[str] = None
+
+
+class AskRequest(BaseModel):
+    question: str
+    fresh: bool = False
+
+
+def _mcq(question: dict, answer: dict, reveal_answers: bool) -> dict:
+    # The shape nsreact/src/App.js renders.
+    mcq = {
+        "question_text": question["question"],
+        "options": [
+            text if letter == text else f"{letter}) {text}" for letter, text in question["options"]
+        ],
+    }
+    if reveal_answers:
+        mcq["correct_answer"] = answer["answer"]
+        mcq["explanation"] = answer["explanation"]
+    return mcq
+
+
+def _unique(items) -> list:
+    return list(dict.fromkeys(item for item in items if item))
+
+
+def _check_quiz_request(quiz_type, topics, num_questions, difficulty, user_id):
+    """The request's topics and difficulty, filling in adaptive choices for the user.
+
+    Adaptive choices read the user's mastery from SQLite; call it in a thread.
+    """
+    if quiz_type not in QUIZ_TYPES:
+        raise HTTPException(400, f"quiz_type must be one of {sorted(QUIZ_TYPES)}")
+    if difficulty not in DIFFICULTIES and difficulty != ADAPTIVE:
+        raise HTTPException(400, f"difficulty must be one of {DIFFICULTIES + [ADAPTIVE]}")
+    if not 1 <= num_questions <= 10:
+        raise HTTPException(400, "num_questions must be between 1 and 10")
+    engine = state["engine"]
+    topics = topics or engine.pick_topics(user_id=user_id)
+    unknown = [name for name in topics if name not in TOPICS]
+    if unknown:
+        raise HTTPException(400, f"unknown topics: {', '.join(unknown)}")
+    if difficulty == ADAPTIVE:
+        difficulty = engine.pick_difficulty(user_id, topics)
+    return topics, difficulty
+
+
+def _quiz_response(quiz: dict, quiz_id: str, reveal_answers: bool) -> dict:
+    public, answer_key = state["engine"].split_answer_key(quiz["questions"])
+    return {
+        "quiz_id": quiz_id,
+        "quiz": {
+            "type": quiz["type"],
+            "difficulty": quiz["difficulty"],
+            "topics": quiz["topics"],
+            "mcqs": [
+                _mcq(question, answer, reveal_answers)
+                for question, answer in zip(public, answer_key)
+            ],
+        },
+        "sources": _unique(quiz.get("sources", [])),
+    }
+
+
+@app.get("/generate_quiz")
+async def generate_quiz_endpoint(
+    quiz_type: str = "mcq",
+    topic: Optional[list[str]] = Query(None),
+    num_questions: int = 5,
+    difficulty: str = "Medium",
+    user_id: Optional[str] = None,
+    reveal_answers: bool = True,
+):
+    """Serve a pooled quiz or generate one, holding the request open.
+
+    The answer key is kept server-side for POST /grade. Answers are
+    included in the response by default because nsreact shows them;
+    pass reveal_answers=false when the client grades through the API.
+    Pass a stable user_id per user to skip questions they have seen;
+    without one nothing is tracked. Slow generations are better
+    submitted to POST /quiz_jobs.
+    """
+    topics, difficulty = await asyncio.to_thread(
+        _check_quiz_request, quiz_type, topic, num_questions, difficulty, user_id
+    )
+    engine = state["engine"]
+    quiz = await asyncio.to_thread(
+        engine.get_quiz, user_id, topics, QUIZ_TYPES[quiz_type], difficulty, num_questions
+    )
+    if not quiz["questions"]:
+        raise HTTPException(502, "The model did not produce any usable questions, please retry")
+    _public, answer_key = engine.split_answer_key(quiz["questions"])
+    quiz_id = await asyncio.to_thread(
+        state["store"].put,
+        {"type": quiz["type"], "topics": topics, "difficulty": difficulty, "answer_key": answer_key},
+    )
+    metrics.increment("api.quizzes")
+    return _quiz_response(quiz, quiz_id, reveal_answers)
+
+
+@app.post("/quiz_jobs", status_code=202)
+async def submit_quiz_job(request: QuizJobRequest):
+    """Start generating a quiz in the background; poll GET /quiz_jobs/{job_id}.
+
+    Without topics, the user's weakest topics are favoured; difficulty
+    "Adaptive" picks Easy, Medium or Hard from their record on them.
+    """
+    topics, difficulty = await asyncio.to_thread(
+        _check_quiz_request,
+        request.quiz_type, request.topics, request.num_questions, request.difficulty, request.user_id,
+    )
+    job_id = await asyncio.to_thread(
+        state["jobs"].submit,
+        request.user_id, topics, QUIZ_TYPES[request.quiz_type], difficulty, request.num_questions,
+    )
+    metrics.increment("api.quiz_jobs")
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get("/quiz_jobs/{job_id}")
+async def quiz_job_status(job_id: str, reveal_answers: bool = True):
+    """Job status with the questions ready so far; the full quiz once done"""
+    job = await asyncio.to_thread(state["jobs"].get, job_id)
+    if job is None:
+        raise HTTPException(404, "Unknown job_id")
+    response = {
+        "job_id": job_id,
+        "status": job["status"],
+        "questions_ready": len(job["questions"]),
+        "num_questions": job["num_questions"],
+        "partial": [_mcq(question, None, False) for question in job["questions"]],
+        "error": job["error"],
+    }
+    if job["status"] == DONE:
+        if not job["quiz"]["questions"]:
+            response["error"] = "The model did not produce any usable questions, please retry"
+        else:
+            response.update(_quiz_response(job["quiz"], job["quiz_id"], reveal_answers))
+    return response
+
+
+@app.delete("/quiz_jobs/{job_id}")
+async def cancel_quiz_job(job_id: str):
+    if not await asyncio.to_thread(state["jobs"].cancel, job_id):
+        raise HTTPException(404, "Unknown or already finished job_id")
+    return {"job_id": job_id, "status": "cancelling"}
+
+
+@app.post("/grade")
+async def grade_endpoint(request: GradeRequest):
+    """Grade answers against the stored key; no model call"""
+    quiz = await asyncio.to_thread(state["store"].get, request.quiz_id)
+    if quiz is None:
+        raise HTTPException(404, "Unknown or expired quiz_id")
+    grade = state["engine"].grade(quiz["answer_key"], request.answers)
+    if request.user_id:
+        saved = state["history"].record(request.user_id, {
+            "type": quiz["type"],
+            "difficulty": quiz.get("difficulty", "Medium"),
+            "topics": quiz["topics"],
+            "total_questions": grade["total"],
+            "correct_answers": grade["correct"],
+            "percentage": grade["percentage"],
+            "time_taken": request.time_taken,
+        })
+        grade["saved"] = await asyncio.to_thread(saved.saved, 5)
+    return grade
+
+
+@app.get("/history/{user_id}")
+async def history_page(user_id: str, cursor: Optional[str] = None, limit: int = Query(20, ge=1, le=200)):
+    """One page of the user's quizzes, newest first; pass next_cursor for the next"""
+    try:
+        items, next_cursor = await asyncio.to_thread(state["history"].page, user_id, cursor, limit)
+    except ValueError:
+        raise HTTPException(400, "Invalid cursor")
+    return {"items": items, "next_cursor": next_cursor}
+
+
+@app.get("/history/{user_id}/export")
+async def history_export(user_id: str, format: str = "ndjson"):
+    """Stream the user's whole history as NDJSON or CSV"""
+    media_types = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+    if format not in media_types:
+        raise HTTPException(400, f"format must be one of {sorted(media_types)}")
+    return StreamingResponse(
+        state["history"].iter_export(user_id, format),
+        media_type=media_types[format],
+        headers={"Content-Disposition": f'attachment; filename="quiz_history.{format}"'},
+    )
+
+
+@app.get("/history/{user_id}/stats")
+async def history_stats(user_id: str):
+    """Totals and accuracy per topic, difficulty and day; user '*' is everyone"""
+    history = state["history"]
+
+    def read():
+        mine = user_id != ALL_USERS
+        return {
+            "summary": history.stats(user_id) if mine else None,
+            "mastery": {
+                topic: {"score": score, "quizzes": quizzes}
+                for topic, (score, quizzes) in history.mastery(user_id).items()
+            } if mine else None,
+            **{f"by_{dimension}": history.rollup(user_id, dimension) for dimension in ROLLUP_DIMENSIONS},
+        }
+
+    return await asyncio.to_thread(read)
+
+
+@app.post("/ask")
+async def ask_endpoint(request: AskRequest):
+    question = request.question.strip()
+    if not question:
+        raise HTTPException(400, "question must not be empty")
+    return await asyncio.to_thread(state["engine"].ask, question, request.fresh)
+
+
+@app.get("/health")
+async def health():
+    return {"status": "ok", "model": MODEL_NAME}
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return metrics.snapshot()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes, each with its own model client.")
+    args = parser.parse_args()
+    print(f"🚀 QuizBot API on http://{args.host}:{args.port}")
+    uvicorn.run("api_server:app", host=args.host, port=args.port, workers=args.workers, app_dir=NSRAG_DIR)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+import argparse
+import sys
+from engine import ADAPTIVE, QUIZ_TYPES, create_engine
+from quiz_pool import DIFFICULTIES
+from topics import TOPICS
+
+
+def take_quiz(engine, args):
+    topics = args.topic or engine.pick_topics(user_id=args.user)
+    difficulty = args.difficulty
+    if difficulty == ADAPTIVE:
+        difficulty = engine.pick_difficulty(args.user, topics)
+    print(f"📝 {args.num} {QUIZ_TYPES[args.type]} questions on {', '.join(topics)} ({difficulty})")
+    quiz = engine.get_quiz(args.user, topics, QUIZ_TYPES[args.type], difficulty, args.num)
+    public, answer_key = engine.split_answer_key(quiz["questions"])
+    if not public:
+        print("❌ The model did not produce any usable questions")
+        return 1
+
+    answers = {}
+    for idx, question in enumerate(public):
+        print(f"\nQuestion {idx + 1}: {question['question']}")
+        for letter, text in question["options"]:
+            print(f"  {text}" if letter == text else f"  {letter}) {text}")
+        choices = [letter for letter, _text in question["options"]]
+        while True:
+            answer = input(f"Your answer ({'/'.join(choices)}): ").strip()
+            match = [choice for choice in choices if choice.lower() == answer.lower()]
+            if match:
+                answers[idx] = match[0]
+                break
+
+    grade = engine.grade(answer_key, answers)
+    print()
+    for idx, result in enumerate(grade["results"]):
+        mark = "✅" if result["is_correct"] else "❌"
+        print(f"{mark} Question {idx + 1}: {result['correct_answer']}  {result['explanation']}")
+    print(f"\n🎯 Score: {grade['correct']}/{grade['total']} ({grade['percentage']:.1f}%)")
+    saved = engine.history.record(args.user, {
+        "type": quiz["type"],
+        "difficulty": difficulty,
+        "topics": topics,
+        "total_questions": grade["total"],
+        "correct_answers": grade["correct"],
+        "percentage": grade["percentage"],
+    })
+    if not saved.saved(timeout=5):
+        print(f"⚠️  Result not saved to history: {saved.error or 'timed out'}")
+    return 0
+
+
+def ask(engine, args):
+    answer = engine.stream_answer(" ".join(args.question), fresh=args.fresh)
+    for chunk in answer.chunks:
+        print(chunk, end="", flush=True)
+    print()
+    if answer.cached:
+        print("💾 (cached answer)")
+    elif answer.sources:
+        print(f"📚 Sources: {', '.join(answer.sources)}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="QuizBot on the command line.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    quiz = commands.add_parser("quiz", help="Take a quiz in the terminal.")
+    quiz.add_argument("--type", choices=sorted(QUIZ_TYPES), default="mcq")
+    quiz.add_argument("--topic", action="append", choices=TOPICS, help="Repeat for several topics.")
+    quiz.add_argument("--num", type=int, default=5, help="Number of questions.")
+    quiz.add_argument(
+        "--difficulty", choices=DIFFICULTIES + [ADAPTIVE], default="Medium",
+        help=f"{ADAPTIVE} picks it from your results on the topics.",
+    )
+    quiz.add_argument("--user", default="cli", help="User id for the quiz pool and history.")
+
+    question = commands.add_parser("ask", help="Ask a question about the course material.")
+    question.add_argument("question", nargs="+")
+    question.add_argument("--fresh", action="store_true", help="Skip cached answers.")
+
+    commands.add_parser("warm-up", help="Open the stores and build missing caches.")
+
+    args = parser.parse_args()
+    engine = create_engine()
+    if args.command == "quiz":
+        return take_quiz(engine, args)
+    if args.command == "ask":
+        return ask(engine, args)
+    print("✅ Engine warmed up")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
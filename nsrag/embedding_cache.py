@@ -0,0 +1,177 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from contextlib import contextmanager
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process locking
+    fcntl = None
+
+
+CACHE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "cache", "embeddings"
+)
+KEY_SIZE = 16
+
+
+class EmbeddingCache:
+    """Persistent embeddings keyed by a hash of the model name and text.
+
+    Vectors are appended as float32 rows to `<model>.f32` and read back
+    through a memory map; `<model>.keys` holds the 16-byte key of each row
+    in the same order. Both files are append-only, so other processes'
+    additions are picked up by reading the new tail of the keys file;
+    rows left without a key by an interrupted write are cut off before
+    the next append.
+    """
+
+    def __init__(self, model: str, cache_path: str = CACHE_PATH):
+        self.model = model
+        base = os.path.join(cache_path, re.sub(r"[^A-Za-z0-9_.-]", "_", model))
+        self.keys_file = f"{base}.keys"
+        self.vectors_file = f"{base}.f32"
+        self.meta_file = f"{base}.json"
+        self.lock_file = f"{base}.lock"
+        self.dim = None
+        self.rows = {}
+        self._keys_offset = 0
+        self._vectors = None
+        self._lock = threading.Lock()
+        os.makedirs(cache_path, exist_ok=True)
+        self._refresh()
+
+    def key(self, kind: str, text: str) -> bytes:
+        data = f"{self.model}\0{kind}\0{text}".encode("utf-8")
+        return hashlib.blake2b(data, digest_size=KEY_SIZE).digest()
+
+    def __len__(self):
+        return len(self.rows)
+
+    @contextmanager
+    def _file_lock(self):
+        if fcntl is None:
+            yield
+            return
+        with open(self.lock_file, "a") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        # Index any rows appended since the last read, by us or another process.
+        if self.dim is None and os.path.exists(self.meta_file):
+            with open(self.meta_file) as f:
+                self.dim = json.load(f)["dim"]
+        if self.dim is None or not os.path.exists(self.keys_file):
+            return
+        with open(self.keys_file, "rb") as f:
+            f.seek(self._keys_offset)
+            data = f.read()
+        usable = len(data) - len(data) % KEY_SIZE
+        if not usable:
+            return
+        first_row = self._keys_offset // KEY_SIZE
+        for i in range(usable // KEY_SIZE):
+            self.rows[data[i * KEY_SIZE : (i + 1) * KEY_SIZE]] = first_row + i
+        self._keys_offset += usable
+        self._vectors = None
+
+    def _matrix(self):
+        if self._vectors is None:
+            self._vectors = np.memmap(
+                self.vectors_file,
+                dtype=np.float32,
+                mode="r",
+                shape=(self._keys_offset // KEY_SIZE, self.dim),
+            )
+        return self._vectors
+
+    @staticmethod
+    def _truncate(path: str, size: int):
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+    def get_many(self, keys: list[bytes]) -> list:
+        """Cached vectors for the keys, with None for misses"""
+        with self._lock:
+            if any(key not in self.rows for key in keys):
+                self._refresh()
+            if not self.rows:
+                return [None] * len(keys)
+            matrix = self._matrix()
+            return [
+                matrix[self.rows[key]].tolist() if key in self.rows else None
+                for key in keys
+            ]
+
+    def put_many(self, keys: list[bytes], vectors: list[list[float]]):
+        if not keys:
+            return
+        vectors = np.asarray(vectors, dtype=np.float32)
+        with self._lock, self._file_lock():
+            self._refresh()
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self.meta_file, "w") as f:
+                    json.dump({"model": self.model, "dim": self.dim}, f)
+            new_keys = []
+            new_rows = []
+            for key, vector in zip(keys, vectors):
+                if key not in self.rows and key not in new_keys:
+                    new_keys.append(key)
+                    new_rows.append(vector)
+            if not new_keys:
+                return
+            # Vectors first: a crash can leave an orphan row or a torn key but
+            # never a key without its vector. Cut both files back to the rows
+            # that have keys, so the new rows line up with their keys.
+            self._truncate(self.keys_file, self._keys_offset)
+            self._truncate(self.vectors_file, self._keys_offset // KEY_SIZE * self.dim * 4)
+            with open(self.vectors_file, "ab") as f:
+                f.write(np.stack(new_rows).astype(np.float32).tobytes())
+            with open(self.keys_file, "ab") as f:
+                f.write(b"".join(new_keys))
+            self._refresh()
+
+
+class CachedEmbeddings(Embeddings):
+    """Check the embedding cache before calling the wrapped model.
+
+    Only embed_documents() is cached: it embeds corpus chunks, so the
+    cache grows with the corpus. Queries come from traffic and would
+    grow it without bound, so embed_query() always calls the model.
+    """
+
+    def __init__(self, embeddings: Embeddings, cache: EmbeddingCache):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.hits = 0
+        self.misses = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        keys = [self.cache.key("document", text) for text in texts]
+        vectors = self.cache.get_many(keys)
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            # Repeated texts (e.g. boilerplate chunks) are embedded once.
+            unique = list(dict.fromkeys(texts[i] for i in missing))
+            computed = dict(zip(unique, self.embeddings.embed_documents(unique)))
+            self.cache.put_many(
+                [self.cache.key("document", text) for text in unique], list(computed.values())
+            )
+            for i in missing:
+                vectors[i] = computed[texts[i]]
+        return vectors
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.embeddings.embed_query(text)
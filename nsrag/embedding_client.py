@@ -0,0 +1,138 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from requests.adapters import HTTPAdapter
+from langchain_core.embeddings import Embeddings
+
+
+# "embed" (/api/embed) batches texts but returns unit-length vectors;
+# "embeddings" (/api/embeddings) embeds one text per request, unnormalized,
+# which is the scale of the shipped nsrag/chroma store. Switching needs a
+# rebuild: python populate_database.py --reset
+EMBED_ENDPOINT = os.environ.get("OLLAMA_EMBED_ENDPOINT", "embeddings")
+EMBED_ENDPOINTS = ("embed", "embeddings")
+
+
+def ollama_base_url() -> str:
+    host = os.environ.get("OLLAMA_HOST", "localhost:11434")
+    if not host.startswith(("http://", "https://")):
+        host = f"http://{host}"
+    return host.rstrip("/")
+
+
+class EmbeddingError(RuntimeError):
+    pass
+
+
+class BatchedOllamaEmbeddings(Embeddings):
+    """Ollama embeddings over one pooled HTTP session per process.
+
+    With the "embed" endpoint, texts are grouped into batches of
+    `batch_size`; with "embeddings", each text is its own request. Up to
+    `max_concurrency` requests are in flight at once. Failed requests are
+    retried with exponential backoff.
+    """
+
+    # Same prefixes as langchain's OllamaEmbeddings, so stored vectors and
+    # queries stay in the same space.
+    embed_instruction = "passage: "
+    query_instruction = "query: "
+
+    def __init__(
+        self,
+        model: str = "nomic-embed-text",
+        base_url: str = None,
+        batch_size: int = 32,
+        max_concurrency: int = 4,
+        max_retries: int = 3,
+        backoff: float = 0.5,
+        timeout: float = 120,
+        endpoint: str = EMBED_ENDPOINT,
+    ):
+        if endpoint not in EMBED_ENDPOINTS:
+            raise ValueError(f"endpoint must be one of {EMBED_ENDPOINTS}, not {endpoint!r}")
+        self.model = model
+        self.endpoint = endpoint
+        self.base_url = (base_url or ollama_base_url()).rstrip("/")
+        self.batch_size = max(1, batch_size) if endpoint == "embed" else 1
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pid = None
+        self._session = None
+        self._executor = None
+
+    @property
+    def cache_name(self) -> str:
+        """Name for cached vectors, which differ in scale between endpoints"""
+        return self.model if self.endpoint == "embed" else f"{self.model}@{self.endpoint}"
+
+    def _ensure_clients(self):
+        # Sessions and threads do not survive a fork, so rebuild them in
+        # child processes (e.g. the ingestion process pool).
+        with self._lock:
+            if self._pid != os.getpid():
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1, pool_maxsize=self.max_concurrency
+                )
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._session = session
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_concurrency, thread_name_prefix="embed"
+                )
+                self._pid = os.getpid()
+        return self._session, self._executor
+
+    def _embed_batch(self, texts: list[str]) -> list[list[float]]:
+        session, _executor = self._ensure_clients()
+        url = f"{self.base_url}/api/{self.endpoint}"
+        if self.endpoint == "embed":
+            payload = {"model": self.model, "input": texts}
+        else:
+            payload = {"model": self.model, "prompt": texts[0]}
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = session.post(url, json=payload, timeout=self.timeout)
+                if response.status_code == 429 or response.status_code >= 500:
+                    raise EmbeddingError(
+                        f"Ollama returned {response.status_code}: {response.text[:200]}"
+                    )
+                response.raise_for_status()
+                body = response.json()
+                embeddings = body["embeddings"] if self.endpoint == "embed" else [body["embedding"]]
+                if len(embeddings) != len(texts):
+                    raise EmbeddingError(
+                        f"Expected {len(texts)} embeddings, got {len(embeddings)}"
+                    )
+                return embeddings
+            except (requests.ConnectionError, requests.Timeout, EmbeddingError):
+                if attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff * (2**attempt))
+
+    def _embed(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        batches = [
+            texts[i : i + self.batch_size]
+            for i in range(0, len(texts), self.batch_size)
+        ]
+        if len(batches) == 1:
+            return self._embed_batch(batches[0])
+        _session, executor = self._ensure_clients()
+        embeddings = []
+        for batch_embeddings in executor.map(self._embed_batch, batches):
+            embeddings.extend(batch_embeddings)
+        return embeddings
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return self._embed([f"{self.embed_instruction}{text}" for text in texts])
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed([f"{self.query_instruction}{text}"])[0]
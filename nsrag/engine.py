@@ -0,0 +1,423 @@
+import os
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, NamedTuple
+from langchain_core.documents import Document
+import metrics
+from answer_cache import AnswerCache
+from get_embedding_function import get_uncached_embedding_function
+from history_store import HistoryStore
+from llm_scheduler import PRIORITY_INTERACTIVE, PRIORITY_QUIZ, get_scheduler
+from mastery import choose_topics, suggest_difficulty
+from pdf_loader import PAGE_SEPARATOR, load_pdf_text
+from prompt_builder import build_feedback_prompt, build_qa_prompt, build_quiz_prompt
+from question_index import QuestionIndex
+from quiz_generator import MODEL_NAME, regenerate_question, repair_questions, stream_questions
+from quiz_grader import grade_quiz, split_answer_key
+from quiz_parser import MCQ, TRUE_FALSE, format_answer_key, format_questions
+from quiz_pool import QuizPool, start_refillers
+
+QUIZ_TYPES = {"mcq": MCQ, "tf": TRUE_FALSE}
+# Difficulty chosen from the user's mastery of the quiz topics.
+ADAPTIVE = "Adaptive"
+# Quiz requests sent to the model at once for one quiz; 1 asks for the whole
+# quiz in a single completion. Raise it together with LLM_MAX_CONCURRENCY
+# when the model server runs requests in parallel (OLLAMA_NUM_PARALLEL).
+QUIZ_PARALLELISM = int(os.environ.get("QUIZ_PARALLELISM", 1))
+# Questions per request when a quiz is split up.
+QUIZ_BATCH_SIZE = int(os.environ.get("QUIZ_BATCH_SIZE", 2))
+# Context chunks for each request of a split quiz, on its single topic.
+BATCH_CONTEXT_K = 4
+# Requests of a split quiz on the same topic each ask about one of these in turn.
+BATCH_ANGLES = (
+    "definitions and core concepts",
+    "how the mechanisms work step by step",
+    "attacks, weaknesses and their defenses",
+    "practical use and configuration",
+    "comparisons with related techniques",
+)
+
+# Used when neither the topic packs nor live retrieval return anything.
+FALLBACK_TEXT = """Network security covers cryptography, authentication, protocols, and security mechanisms.
+Key topics include: RSA encryption, symmetric/asymmetric encryption, hash functions, digital signatures,
+TLS/SSL protocols, key exchange mechanisms, and various attack vectors."""
+
+
+class QuizCancelled(Exception):
+    pass
+
+
+class AnswerStream(NamedTuple):
+    chunks: Iterator[str]
+    sources: list
+    cached: bool
+
+
+class QuizEngine:
+    """Quiz generation, grading and Q&A over the ingested corpus.
+
+    One engine per process holds the model client, quiz pool, answer
+    cache, question index and quiz history; the Streamlit app, the CLI
+    and the HTTP API are thin clients of it. Model calls go through the
+    process-wide scheduler, Q&A and feedback ahead of quiz generation.
+    warm_up() opens the vector store, keyword index and topic packs up
+    front so the first request does not pay for them.
+    """
+
+    def __init__(
+        self,
+        model=None,
+        pool: QuizPool = None,
+        answer_cache: AnswerCache = None,
+        history: HistoryStore = None,
+        question_index: QuestionIndex = None,
+        parallelism: int = QUIZ_PARALLELISM,
+        batch_size: int = QUIZ_BATCH_SIZE,
+    ):
+        if model is None:
+            scheduler = get_scheduler()
+            model = scheduler.client(PRIORITY_QUIZ)
+            self.chat_model = scheduler.client(PRIORITY_INTERACTIVE)
+        else:
+            self.chat_model = model
+        self.model = model
+        self.pool = pool or QuizPool()
+        # Both define __len__, so an empty one is falsy.
+        if answer_cache is None:
+            answer_cache = AnswerCache(get_uncached_embedding_function(), MODEL_NAME)
+        if question_index is None:
+            question_index = QuestionIndex(get_uncached_embedding_function())
+        self.answer_cache = answer_cache
+        self.question_index = question_index
+        self.history = history or HistoryStore()
+        self.parallelism = max(1, parallelism)
+        self.batch_size = max(1, batch_size)
+        self._pdf_text = None
+        self._pdf_lock = threading.Lock()
+
+    def warm_up(self):
+        from retriever import get_keyword_index, get_vector_store
+        from topic_packs import load_packs
+
+        get_vector_store()
+        get_keyword_index()
+        load_packs()
+
+    def start_refillers(self, workers: int, interval: float = 30.0):
+        return start_refillers(self, workers, interval=interval)
+
+    def pick_topics(self, count: int = 2, user_id: str = None) -> list[str]:
+        """Topics for a quiz, leaning towards the ones the user is weakest in"""
+        return choose_topics(self.history.mastery(user_id) if user_id else {}, count)
+
+    def pick_difficulty(self, user_id: str, topics: list[str], default: str = "Medium") -> str:
+        """Difficulty matching the user's mastery of `topics`; `default` for new topics"""
+        return suggest_difficulty(self.history.mastery(user_id) if user_id else {}, topics, default)
+
+    # Context
+
+    def fallback_results(self, max_chars: int):
+        """Leading PDF pages as (Document, score) pairs when retrieval fails"""
+        with self._pdf_lock:
+            if self._pdf_text is None:
+                try:
+                    self._pdf_text = load_pdf_text(max_chars=3000)
+                except Exception:
+                    self._pdf_text = FALLBACK_TEXT
+        pages = self._pdf_text[:max_chars].split(PAGE_SEPARATOR)
+        return [(Document(page_content=page), 0.0) for page in pages]
+
+    def topic_context(self, topics: list[str], k: int = 6):
+        """Best context chunks for the quiz topics"""
+        try:
+            from topic_packs import topic_results
+
+            # Precomputed packs when current, live retrieval otherwise
+            results = topic_results(topics, k=k)
+            if results:
+                return results
+        except Exception:
+            metrics.increment("engine.retrieval_fallback")
+        return self.fallback_results(3000)
+
+    def question_context(self, question: str, k: int = 4):
+        """Best context chunks for an open-ended question"""
+        try:
+            from retriever import retrieve
+
+            results = retrieve(question, k=k)
+            if results:
+                return results
+        except Exception:
+            metrics.increment("engine.retrieval_fallback")
+        return self.fallback_results(2000)
+
+    # Quizzes
+
+    def pooled_quiz(self, user_id: str, topics, quiz_type, difficulty, num_questions):
+        """A ready-made quiz the user has not seen, or None"""
+        quiz = self.pool.take(user_id, topics, quiz_type, difficulty, num_questions)
+        if quiz is not None:
+            quiz["context_results"] = []
+            quiz["prompt_tokens"] = None
+            metrics.increment("engine.quiz_pooled")
+        return quiz
+
+    def _repeats(self, user_id, questions, accepted) -> list[bool]:
+        if not questions:
+            return []
+        try:
+            # Without a user, questions are still checked against the rest of the quiz.
+            return self.question_index.repeats(user_id or None, questions, accepted)
+        except Exception:
+            # A broken index must not cost the user their quiz.
+            metrics.increment("question_index.error")
+            return [False] * len(questions)
+
+    def _mark_seen(self, user_id, questions):
+        if not user_id:
+            return
+        try:
+            self.question_index.mark_seen(user_id, [q for q in questions if not q["malformed"]])
+        except Exception:
+            metrics.increment("question_index.error")
+
+    def _replace_repeats(
+        self, user_id, questions, repeats, num_questions, quiz_type, topics, difficulty, results, model=None
+    ):
+        """Ask for new questions in place of the repeats dropped, up to `parallelism` at a time"""
+        attempts = 2 * len(repeats)
+        while repeats and len(questions) < num_questions and attempts > 0:
+            wanted = min(num_questions - len(questions), attempts, self.parallelism)
+            attempts -= wanted
+            avoid = [q["question"] for q in questions + repeats]
+
+            def regenerate(_index):
+                return regenerate_question(model or self.model, quiz_type, topics, difficulty, results, avoid)
+
+            if wanted == 1:
+                candidates = [regenerate(0)]
+            else:
+                with ThreadPoolExecutor(max_workers=wanted, thread_name_prefix="quiz-batch") as executor:
+                    candidates = list(executor.map(regenerate, range(wanted)))
+            for question in candidates:
+                if question is None:
+                    continue
+                if self._repeats(user_id, [question], questions)[0]:
+                    repeats.append(question)
+                    continue
+                questions.append(question)
+        return questions
+
+    def plan_batches(self, topics, num_questions) -> list[tuple[list[str], int]]:
+        """(topics, number of questions) of each model request for a quiz.
+
+        With parallelism, the quiz is split into requests of at most
+        `batch_size` questions, each on one topic in turn.
+        """
+        if self.parallelism == 1 or num_questions <= self.batch_size:
+            return [(topics, num_questions)]
+        count = -(-num_questions // self.batch_size)
+        sizes = [num_questions // count + (1 if i < num_questions % count else 0) for i in range(count)]
+        return [([topics[i % len(topics)]], size) for i, size in enumerate(sizes)]
+
+    def batch_contexts(self, batches) -> list[tuple[list, str]]:
+        """(context chunks, angle) of each request of a split quiz.
+
+        Requests on the same topic share out its chunks, every n-th to
+        each, and ask about different angles, so their prompts differ.
+        """
+        per_topic = Counter(tuple(batch_topics) for batch_topics, _count in batches)
+        packs = {
+            topic: self.topic_context(list(topic), k=BATCH_CONTEXT_K * count)
+            for topic, count in per_topic.items()
+        }
+        turns = Counter()
+        contexts = []
+        for batch_topics, _count in batches:
+            topic = tuple(batch_topics)
+            turn, count = turns[topic], per_topic[topic]
+            turns[topic] += 1
+            # More requests than chunks: the angle alone sets them apart.
+            results = packs[topic][turn::count] or packs[topic]
+            contexts.append((results, BATCH_ANGLES[turn % len(BATCH_ANGLES)] if count > 1 else None))
+        return contexts
+
+    def generate_quiz(
+        self, topics, quiz_type, difficulty, num_questions, on_question=None, stop=None, user_id=None, model=None
+    ) -> dict:
+        """Generate a quiz with the model.
+
+        `on_question` is called with the usable questions so far each time
+        the stream completes one, for live previews. Setting the `stop`
+        event abandons the generation with QuizCancelled. Given a
+        `user_id`, questions repeating ones the user has seen, or each
+        other, are dropped before they are shown and replaced at the end;
+        without one, only repeats within the quiz are. When plan_batches()
+        splits the quiz, the requests stream side by side, up to
+        `parallelism` at a time, into the same question list. `model`
+        overrides the engine's model, e.g. for pool refills.
+        """
+        model = model or self.model
+        batches = self.plan_batches(topics, num_questions)
+        if len(batches) == 1:
+            contexts = [(self.topic_context(topics), None)]
+        else:
+            contexts = self.batch_contexts(batches)
+        questions = []
+        repeats = []
+        lock = threading.Lock()
+
+        def collect(question):
+            # Streams of a split quiz finish questions concurrently.
+            with lock:
+                if not question["malformed"]:
+                    usable = [q for q in questions if not q["malformed"]]
+                    if self._repeats(user_id, [question], usable)[0]:
+                        repeats.append(question)
+                        return
+                questions.append(question)
+                if on_question is not None and not question["malformed"]:
+                    on_question([q for q in questions if not q["malformed"]])
+
+        def generate(batch_topics, count, batch_results, focus):
+            prompt = build_quiz_prompt(quiz_type, batch_topics, count, difficulty, batch_results, focus=focus)
+            for question in stream_questions(model, prompt.text, quiz_type, stop=stop):
+                collect(question)
+            return batch_results, prompt.tokens
+
+        if len(batches) == 1:
+            outcomes = [generate(*batches[0], *contexts[0])]
+        else:
+            workers = min(self.parallelism, len(batches))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quiz-batch") as executor:
+                futures = [
+                    executor.submit(generate, *batch, *context) for batch, context in zip(batches, contexts)
+                ]
+            outcomes = [future.result() for future in futures if future.exception() is None]
+            failed = [future.exception() for future in futures if future.exception() is not None]
+            metrics.increment("engine.quiz_batches", len(batches))
+            if failed:
+                metrics.increment("engine.quiz_batch_failed", len(failed))
+                if not outcomes:
+                    raise failed[0]
+        if stop is not None and stop.is_set():
+            raise QuizCancelled()
+        # Context of every request, each chunk once
+        chunks = {}
+        for batch_results, _tokens in outcomes:
+            for doc, score in batch_results:
+                chunks.setdefault(doc.metadata.get("id") or id(doc), (doc, score))
+        results = list(chunks.values())
+        prompt_tokens = sum(tokens for _results, tokens in outcomes)
+        # Regenerate malformed questions one at a time
+        if any(q["malformed"] for q in questions):
+            checked = {id(q) for q in questions if not q["malformed"]}
+            questions = repair_questions(model, questions, quiz_type, topics, difficulty, results)
+            repaired = [q for q in questions if id(q) not in checked]
+            flags = self._repeats(user_id, repaired, [q for q in questions if id(q) in checked])
+            dropped = {id(q) for q, repeat in zip(repaired, flags) if repeat}
+            repeats += [q for q in repaired if id(q) in dropped]
+            questions = [q for q in questions if id(q) not in dropped]
+        if repeats:
+            questions = self._replace_repeats(
+                user_id, questions, repeats, num_questions, quiz_type, topics, difficulty, results, model
+            )
+        metrics.increment("engine.quiz_generated")
+        return {
+            "type": quiz_type,
+            "topics": topics,
+            "difficulty": difficulty,
+            # Split requests may together return more than asked for
+            "questions": questions[:num_questions],
+            "sources": [doc.metadata.get("id") for doc, _score in results],
+            "context_results": results,
+            "prompt_tokens": prompt_tokens,
+        }
+
+    def get_quiz(self, user_id, topics, quiz_type, difficulty, num_questions, on_question=None, stop=None) -> dict:
+        """Serve from the pool when possible, generate otherwise.
+
+        Either way the user is not given questions they have seen before,
+        and the questions served are added to their seen set.
+        """
+        quiz = self.pooled_quiz(user_id, topics, quiz_type, difficulty, num_questions)
+        if quiz is not None:
+            flags = self._repeats(user_id, quiz["questions"], [])
+            if any(flags):
+                repeats = [q for q, repeat in zip(quiz["questions"], flags) if repeat]
+                quiz["context_results"] = self.topic_context(topics)
+                quiz["questions"] = self._replace_repeats(
+                    user_id,
+                    [q for q, repeat in zip(quiz["questions"], flags) if not repeat],
+                    repeats, num_questions, quiz_type, topics, difficulty, quiz["context_results"],
+                )
+        else:
+            quiz = self.generate_quiz(topics, quiz_type, difficulty, num_questions, on_question, stop, user_id)
+        self._mark_seen(user_id, quiz["questions"])
+        return quiz
+
+    @staticmethod
+    def split_answer_key(questions):
+        return split_answer_key(questions)
+
+    @staticmethod
+    def grade(answer_key, user_answers) -> dict:
+        return grade_quiz(answer_key, user_answers)
+
+    def stream_feedback(self, quiz_type, questions, user_answers: dict, context_results, answer_key):
+        """Stream the optional in-depth feedback on a graded quiz.
+
+        The prompt carries the `answer_key` the quiz was graded against,
+        so the feedback agrees with the score.
+        """
+        user_ans_str = ", ".join(
+            f"{i + 1}. {user_answers.get(i, 'No answer')}" for i in range(len(questions))
+        )
+        prompt = build_feedback_prompt(
+            quiz_type, format_questions(questions), user_ans_str, context_results, format_answer_key(answer_key)
+        )
+        return self.chat_model.stream(prompt.text)
+
+    # Q&A
+
+    def stream_answer(self, question: str, fresh: bool = False) -> AnswerStream:
+        """Answer a question, from the answer cache unless `fresh` is set.
+
+        A cached answer arrives as a single chunk; a generated one is
+        stored in the cache once it has streamed to the end.
+        """
+        cached = None if fresh else self.answer_cache.lookup(question)
+        if cached:
+            return AnswerStream(iter([cached.answer]), [], True)
+        results = self.question_context(question)
+        prompt = build_qa_prompt(question, results)
+
+        def chunks():
+            parts = []
+            for chunk in self.chat_model.stream(prompt.text, cache=not fresh):
+                parts.append(chunk)
+                yield chunk
+            self.answer_cache.store(question, "".join(parts))
+
+        sources = [doc.metadata.get("id") for doc, _score in results]
+        return AnswerStream(chunks(), [source for source in dict.fromkeys(sources) if source], False)
+
+    def ask(self, question: str, fresh: bool = False) -> dict:
+        answer = self.stream_answer(question, fresh)
+        return {"answer": "".join(answer.chunks), "cached": answer.cached, "sources": answer.sources}
+
+
+def create_engine(warm_up: bool = True) -> QuizEngine:
+    engine = QuizEngine()
+    if warm_up:
+        try:
+            engine.warm_up()
+        except Exception as e:
+            # Retrieval falls back per request; the engine is still usable.
+            print(f"⚠️  Warm-up failed: {e}")
+    workers = int(os.environ.get("QUIZ_POOL_REFILL_WORKERS", 0))
+    if workers:
+        engine.start_refillers(workers, interval=float(os.environ.get("QUIZ_POOL_REFILL_INTERVAL", 30)))
+    return engine
@@ -1,12 +1,26 @@
-from langchain_community.embeddings.ollama import OllamaEmbeddings
+import os
+from functools import lru_cache
 from langchain_community.embeddings.bedrock import BedrockEmbeddings
+from embedding_client import BatchedOllamaEmbeddings
+from embedding_cache import CachedEmbeddings, EmbeddingCache
 import warnings
 warnings.filterwarnings("ignore")
 
 
+@lru_cache(maxsize=1)
 def get_embedding_function():
     # embeddings = BedrockEmbeddings(
     #     credentials_profile_name="default", region_name="us-east-1"
     # )
-    embeddings = OllamaEmbeddings(model="nomic-embed-text")
-    return embeddings
+    embeddings = BatchedOllamaEmbeddings(
+        model="nomic-embed-text",
+        batch_size=int(os.environ.get("EMBED_BATCH_SIZE", 32)),
+        max_concurrency=int(os.environ.get("EMBED_CONCURRENCY", 4)),
+    )
+    # Unchanged chunks are served from disk when the corpus is re-ingested.
+    return CachedEmbeddings(embeddings, EmbeddingCache(embeddings.cache_name))
+
+
+def get_uncached_embedding_function():
+    """The same model without the chunk cache, for texts that come from traffic"""
+    return get_embedding_function().embeddings
@@ -0,0 +1,454 @@
+import csv
+import io
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import closing
+from datetime import datetime
+from mastery import MASTERY_ALPHA
+from sqlite_store import NSRAG_DIR, connect, create_tables
+
+
+HISTORY_PATH = os.environ.get("QUIZ_HISTORY_DB", os.path.join(NSRAG_DIR, "db", "history.sqlite3"))
+# Most writes one commit may carry.
+BATCH_SIZE = 256
+# Rollups under this user id cover every user (the whole class).
+ALL_USERS = "*"
+EXPORT_BATCH = 500
+EXPORT_FIELDS = [
+    "id", "date", "type", "difficulty", "topics", "total_questions",
+    "correct_answers", "percentage", "time_taken",
+]
+# A process re-reads a user's mastery this often, to see other processes' writes.
+MASTERY_CACHE_SECONDS = 30
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quizzes (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    taken_at REAL NOT NULL,
+    type TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    topics TEXT NOT NULL,
+    total_questions INTEGER NOT NULL,
+    correct_answers INTEGER NOT NULL,
+    percentage REAL NOT NULL,
+    time_taken INTEGER
+);
+CREATE INDEX IF NOT EXISTS quizzes_by_user_date ON quizzes (user_id, taken_at);
+CREATE TABLE IF NOT EXISTS quiz_topics (
+    quiz_id INTEGER NOT NULL,
+    user_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    taken_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quiz_topics_by_user ON quiz_topics (user_id, topic, taken_at);
+CREATE INDEX IF NOT EXISTS quiz_topics_by_topic ON quiz_topics (topic, taken_at);
+CREATE INDEX IF NOT EXISTS quiz_topics_by_quiz ON quiz_topics (quiz_id);
+CREATE TABLE IF NOT EXISTS user_stats (
+    user_id TEXT PRIMARY KEY,
+    total_quizzes INTEGER NOT NULL,
+    total_questions INTEGER NOT NULL,
+    total_correct INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rollups (
+    user_id TEXT NOT NULL,
+    dimension TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    quizzes INTEGER NOT NULL,
+    questions INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    PRIMARY KEY (user_id, dimension, bucket)
+);
+CREATE TABLE IF NOT EXISTS mastery (
+    user_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    score REAL NOT NULL,
+    quizzes INTEGER NOT NULL,
+    PRIMARY KEY (user_id, topic)
+) WITHOUT ROWID;
+"""
+# Rollup dimensions and the buckets a quiz falls into.
+ROLLUP_DIMENSIONS = {
+    "topic": lambda quiz: quiz["topics"],
+    "difficulty": lambda quiz: [quiz["difficulty"]],
+    "day": lambda quiz: [datetime.fromtimestamp(quiz["taken_at"]).strftime("%Y-%m-%d")],
+}
+
+EMPTY_STATS = {"total_quizzes": 0, "total_questions": 0, "total_correct": 0, "accuracy": 0}
+
+
+def _encode_cursor(record: dict) -> str:
+    return f"{record['taken_at']!r}:{record['id']}"
+
+
+def _decode_cursor(cursor: str):
+    taken_at, quiz_id = cursor.rsplit(":", 1)
+    return float(taken_at), int(quiz_id)
+
+
+def _accuracy(questions: int, correct: int) -> float:
+    return (correct / questions * 100) if questions > 0 else 0
+
+
+def _record(row) -> dict:
+    quiz_id, taken_at, quiz_type, difficulty, topics, total, correct, percentage, time_taken = row
+    return {
+        "id": quiz_id,
+        "date": datetime.fromtimestamp(taken_at).strftime("%Y-%m-%d %H:%M:%S"),
+        "taken_at": taken_at,
+        "type": quiz_type,
+        "difficulty": difficulty,
+        "topics": json.loads(topics),
+        "total_questions": total,
+        "correct_answers": correct,
+        "percentage": percentage,
+        "time_taken": time_taken,
+    }
+
+
+class WriteResult(threading.Event):
+    """Set once a queued write has been committed or has failed; `error` says which"""
+
+    def __init__(self):
+        super().__init__()
+        self.error = None
+
+    def fail(self, error: BaseException):
+        self.error = error
+        self.set()
+
+    def saved(self, timeout: float = None) -> bool:
+        """Wait for the write; True only if it was committed"""
+        return self.wait(timeout) and self.error is None
+
+
+class HistoryStore:
+    """Graded quizzes per user, in SQLite (WAL) shared by every process.
+
+    Each user's totals are kept in `user_stats`, and per topic, difficulty
+    and day in `rollups` (for the user and for ALL_USERS), updated in the
+    same transaction as the quiz row, so stats never scan quizzes.
+    Listing is keyset-paginated on (taken_at, id). Each graded quiz also
+    moves the user's exponentially weighted accuracy on its topics
+    (`mastery`, one row per user and topic), which adaptive topic and
+    difficulty selection read from an in-process cache.
+    Writes go through a single writer thread that commits whatever has
+    queued up in one transaction, each write under its own savepoint so a
+    bad one fails alone; record() returns a WriteResult that is set once
+    the write is committed or has failed.
+    """
+
+    def __init__(self, path: str = HISTORY_PATH):
+        self.path = path
+        create_tables(path, SCHEMA)
+        with closing(self._connect()) as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version < SCHEMA_VERSION:
+                # Databases from before the rollups or mastery tables existed.
+                conn.execute("BEGIN IMMEDIATE")
+                if version < 1:
+                    self._rebuild_rollups(conn)
+                self._rebuild_mastery(conn)
+                conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+                conn.execute("COMMIT")
+        # user_id -> (loaded_at, {topic: (score, quizzes)})
+        self._mastery_cache = {}
+        self._mastery_lock = threading.Lock()
+        # Bumped on every write, so a read that raced one is not cached.
+        self._mastery_generation = 0
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, daemon=True, name="history-writer")
+        self._writer.start()
+
+    def _connect(self):
+        conn = connect(self.path)
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # Writes
+
+    def record(self, user_id: str, quiz: dict) -> WriteResult:
+        """Queue a graded quiz; wait on the returned result to read it back"""
+        done = WriteResult()
+        self._queue.put(("record", user_id, dict(quiz, taken_at=quiz.get("taken_at", time.time())), done))
+        return done
+
+    def clear(self, user_id: str) -> WriteResult:
+        done = WriteResult()
+        self._queue.put(("clear", user_id, None, done))
+        return done
+
+    def _write_loop(self):
+        conn = None
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                if conn is None:
+                    conn = self._connect()
+                self._write_batch(conn, batch)
+            except Exception as e:
+                # The whole transaction is lost (e.g. the database stayed
+                # locked); fail every write in it and keep the writer alive.
+                if conn is not None and conn.in_transaction:
+                    try:
+                        conn.execute("ROLLBACK")
+                    except sqlite3.Error:
+                        conn.close()
+                        conn = None
+                print(f"⚠️  Failed to save quiz history: {e}")
+                for *_op, done in batch:
+                    if done.error is None:
+                        done.error = e
+            finally:
+                with self._mastery_lock:
+                    self._mastery_generation += 1
+                    for _op, user_id, _quiz, _done in batch:
+                        self._mastery_cache.pop(user_id, None)
+                for *_op, done in batch:
+                    done.set()
+
+    def _write_batch(self, conn, batch):
+        conn.execute("BEGIN IMMEDIATE")
+        for op, user_id, quiz, done in batch:
+            conn.execute("SAVEPOINT write")
+            try:
+                if op == "record":
+                    self._insert(conn, user_id, quiz)
+                else:
+                    self._delete_user(conn, user_id)
+            except Exception as e:
+                conn.execute("ROLLBACK TO write")
+                print(f"⚠️  Failed to save quiz history for {user_id}: {e}")
+                done.error = e
+            conn.execute("RELEASE write")
+        conn.execute("COMMIT")
+
+    def _insert(self, conn, user_id: str, quiz: dict):
+        topics = list(quiz.get("topics", []))
+        quiz_id = conn.execute(
+            "INSERT INTO quizzes (user_id, taken_at, type, difficulty, topics, total_questions, "
+            "correct_answers, percentage, time_taken) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                user_id,
+                quiz["taken_at"],
+                quiz["type"],
+                quiz.get("difficulty", "Medium"),
+                json.dumps(topics),
+                quiz["total_questions"],
+                quiz["correct_answers"],
+                quiz["percentage"],
+                quiz.get("time_taken"),
+            ),
+        ).lastrowid
+        conn.executemany(
+            "INSERT INTO quiz_topics (quiz_id, user_id, topic, taken_at) VALUES (?, ?, ?, ?)",
+            [(quiz_id, user_id, topic, quiz["taken_at"]) for topic in topics],
+        )
+        conn.execute(
+            "INSERT INTO user_stats (user_id, total_quizzes, total_questions, total_correct, updated_at) "
+            "VALUES (?, 1, ?, ?, ?) ON CONFLICT (user_id) DO UPDATE SET "
+            "total_quizzes = total_quizzes + 1, "
+            "total_questions = total_questions + excluded.total_questions, "
+            "total_correct = total_correct + excluded.total_correct, "
+            "updated_at = excluded.updated_at",
+            (user_id, quiz["total_questions"], quiz["correct_answers"], quiz["taken_at"]),
+        )
+        self._add_rollups(conn, user_id, dict(quiz, topics=topics, difficulty=quiz.get("difficulty", "Medium")))
+        self._update_mastery(conn, user_id, topics, quiz["total_questions"], quiz["correct_answers"])
+
+    def _update_mastery(self, conn, user_id: str, topics: list[str], total: int, correct: int):
+        if total <= 0:
+            return
+        # One upsert per topic; the first quiz on a topic sets its score outright.
+        conn.executemany(
+            "INSERT INTO mastery (user_id, topic, score, quizzes) VALUES (?, ?, ?, 1) "
+            "ON CONFLICT (user_id, topic) DO UPDATE SET "
+            "score = score + ? * (excluded.score - score), quizzes = quizzes + 1",
+            [(user_id, topic, correct / total, MASTERY_ALPHA) for topic in topics],
+        )
+
+    def _add_rollups(self, conn, user_id: str, quiz: dict, sign: int = 1):
+        rows = []
+        for dimension, buckets in ROLLUP_DIMENSIONS.items():
+            for bucket in buckets(quiz):
+                for owner in (user_id, ALL_USERS):
+                    rows.append((
+                        owner, dimension, bucket, sign,
+                        sign * quiz["total_questions"], sign * quiz["correct_answers"],
+                    ))
+        conn.executemany(
+            "INSERT INTO rollups (user_id, dimension, bucket, quizzes, questions, correct) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (user_id, dimension, bucket) DO UPDATE SET "
+            "quizzes = quizzes + excluded.quizzes, "
+            "questions = questions + excluded.questions, "
+            "correct = correct + excluded.correct",
+            rows,
+        )
+
+    def _rebuild_rollups(self, conn):
+        conn.execute("DELETE FROM rollups")
+        rows = conn.execute(
+            "SELECT user_id, taken_at, difficulty, topics, total_questions, correct_answers FROM quizzes"
+        )
+        for user_id, taken_at, difficulty, topics, total, correct in rows.fetchall():
+            quiz = {
+                "taken_at": taken_at,
+                "difficulty": difficulty,
+                "topics": json.loads(topics),
+                "total_questions": total,
+                "correct_answers": correct,
+            }
+            self._add_rollups(conn, user_id, quiz)
+
+    def _rebuild_mastery(self, conn):
+        conn.execute("DELETE FROM mastery")
+        rows = conn.execute(
+            "SELECT user_id, topics, total_questions, correct_answers FROM quizzes ORDER BY taken_at, id"
+        )
+        for user_id, topics, total, correct in rows.fetchall():
+            self._update_mastery(conn, user_id, json.loads(topics), total, correct)
+
+    def _delete_user(self, conn, user_id: str):
+        # Take the user's share out of the class-wide rollups first.
+        conn.executemany(
+            "UPDATE rollups SET quizzes = quizzes - ?, questions = questions - ?, correct = correct - ? "
+            "WHERE user_id = ? AND dimension = ? AND bucket = ?",
+            [
+                (quizzes, questions, correct, ALL_USERS, dimension, bucket)
+                for dimension, bucket, quizzes, questions, correct in conn.execute(
+                    "SELECT dimension, bucket, quizzes, questions, correct FROM rollups WHERE user_id = ?",
+                    (user_id,),
+                ).fetchall()
+            ],
+        )
+        conn.execute("DELETE FROM rollups WHERE user_id = ? OR quizzes <= 0", (user_id,))
+        conn.execute("DELETE FROM quiz_topics WHERE user_id = ?", (user_id,))
+        conn.execute("DELETE FROM quizzes WHERE user_id = ?", (user_id,))
+        conn.execute("DELETE FROM user_stats WHERE user_id = ?", (user_id,))
+        conn.execute("DELETE FROM mastery WHERE user_id = ?", (user_id,))
+
+    # Reads
+
+    def stats(self, user_id: str) -> dict:
+        """The user's running totals, without touching their quizzes"""
+        with closing(self._connect()) as conn:
+            row = conn.execute(
+                "SELECT total_quizzes, total_questions, total_correct FROM user_stats WHERE user_id = ?",
+                (user_id,),
+            ).fetchone()
+        if row is None:
+            return dict(EMPTY_STATS)
+        total_quizzes, total_questions, total_correct = row
+        return {
+            "total_quizzes": total_quizzes,
+            "total_questions": total_questions,
+            "total_correct": total_correct,
+            "accuracy": _accuracy(total_questions, total_correct),
+        }
+
+    def mastery(self, user_id: str) -> dict:
+        """The user's {topic: (score, quizzes)}, score being weighted accuracy from 0 to 1"""
+        now = time.monotonic()
+        with self._mastery_lock:
+            cached = self._mastery_cache.get(user_id)
+            generation = self._mastery_generation
+        if cached is not None and now - cached[0] < MASTERY_CACHE_SECONDS:
+            return cached[1]
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT topic, score, quizzes FROM mastery WHERE user_id = ?", (user_id,)
+            ).fetchall()
+        mastery = {topic: (score, quizzes) for topic, score, quizzes in rows}
+        with self._mastery_lock:
+            if generation == self._mastery_generation:
+                self._mastery_cache[user_id] = (now, mastery)
+        return mastery
+
+    def page(self, user_id: str, cursor: str = None, limit: int = 20):
+        """One page of the user's quizzes, newest first, and the cursor of the next page.
+
+        The cursor is opaque to callers; None means there are no more pages.
+        """
+        query = (
+            "SELECT id, taken_at, type, difficulty, topics, total_questions, correct_answers, "
+            "percentage, time_taken FROM quizzes WHERE user_id = ?"
+        )
+        params = [user_id]
+        if cursor:
+            taken_at, quiz_id = _decode_cursor(cursor)
+            query += " AND (taken_at < ? OR (taken_at = ? AND id < ?))"
+            params += [taken_at, taken_at, quiz_id]
+        query += " ORDER BY taken_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
+        with closing(self._connect()) as conn:
+            rows = conn.execute(query, params).fetchall()
+        records = [_record(row) for row in rows[:limit]]
+        next_cursor = _encode_cursor(records[-1]) if len(rows) > limit else None
+        return records, next_cursor
+
+    def recent(self, user_id: str, limit: int = 20) -> list[dict]:
+        """The user's latest quizzes, newest first"""
+        return self.page(user_id, limit=limit)[0]
+
+    def iter_records(self, user_id: str, batch: int = EXPORT_BATCH):
+        """Every quiz of the user, newest first, read one page at a time"""
+        cursor = None
+        while True:
+            records, cursor = self.page(user_id, cursor, batch)
+            yield from records
+            if cursor is None:
+                return
+
+    def iter_export(self, user_id: str, fmt: str = "ndjson"):
+        """Yield the user's history as NDJSON lines or CSV rows"""
+        if fmt == "ndjson":
+            for record in self.iter_records(user_id):
+                yield json.dumps({field: record[field] for field in EXPORT_FIELDS}) + "\n"
+            return
+        if fmt != "csv":
+            raise ValueError(f"Unknown export format: {fmt}")
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_FIELDS)
+        for record in self.iter_records(user_id):
+            writer.writerow(
+                ";".join(record[field]) if field == "topics" else record[field]
+                for field in EXPORT_FIELDS
+            )
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    def rollup(self, user_id: str, dimension: str) -> list[dict]:
+        """Accuracy per topic, difficulty or day; ALL_USERS for the whole class"""
+        if dimension not in ROLLUP_DIMENSIONS:
+            raise ValueError(f"Unknown rollup dimension: {dimension}")
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                "SELECT bucket, quizzes, questions, correct FROM rollups "
+                "WHERE user_id = ? AND dimension = ? ORDER BY bucket",
+                (user_id, dimension),
+            ).fetchall()
+        return [
+            {
+                dimension: bucket,
+                "quizzes": quizzes,
+                "questions": questions,
+                "correct": correct,
+                "accuracy": _accuracy(questions, correct),
+            }
+            for bucket, quizzes, questions, correct in rows
+        ]
@@ -0,0 +1,181 @@
+import gzip
+import hashlib
+import heapq
+import json
+import math
+import os
+import re
+from collections import Counter
+from contextlib import closing
+from sqlite_store import connect, create_tables
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "how",
+    "in", "is", "it", "of", "on", "or", "that", "the", "this", "to", "was",
+    "what", "when", "which", "with",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    chunk_id TEXT PRIMARY KEY,
+    length INTEGER NOT NULL,
+    digest TEXT NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    tf INTEGER NOT NULL,
+    PRIMARY KEY (term, chunk_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_chunk ON postings (chunk_id);
+CREATE TABLE IF NOT EXISTS totals (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    chunks INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL
+);
+INSERT OR IGNORE INTO totals VALUES (0, 0, 0, '0000000000000000');
+"""
+
+
+def tokenize(text: str) -> list[str]:
+    return [
+        token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS
+    ]
+
+
+def index_path(chroma_path: str) -> str:
+    # Lives inside the Chroma directory so --reset clears both together.
+    return os.path.join(chroma_path, "bm25.sqlite3")
+
+
+def chunk_digest(chunk_id: str, text: str) -> str:
+    """Hash of a chunk's ID and text; changes when either does"""
+    return hashlib.sha256(f"{chunk_id}\0{text}".encode("utf-8")).hexdigest()[:16]
+
+
+def _xor(a: str, b: str) -> str:
+    return f"{int(a, 16) ^ int(b, 16):016x}"
+
+
+class BM25Index:
+    """Inverted index over the ingested chunks with BM25 scoring.
+
+    Postings and chunk lengths live in SQLite next to the Chroma store,
+    so adding or removing a chunk touches only its own rows and a search
+    reads only the postings of the query terms. Chunk text is not kept
+    here; it is read back from Chroma by ID. The corpus fingerprint is
+    the XOR of every chunk's digest, kept up to date on each change.
+    """
+
+    def __init__(self, path: str, k1: float = 1.5, b: float = 0.75):
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        create_tables(path, SCHEMA)
+        self._import_legacy()
+
+    def _import_legacy(self):
+        # The index used to be one gzipped JSON file; carry its chunks over once.
+        legacy_path = os.path.join(os.path.dirname(self.path), "bm25.json.gz")
+        if not os.path.exists(legacy_path):
+            return
+        if not len(self):
+            with gzip.open(legacy_path, "rt", encoding="utf-8") as f:
+                documents = json.load(f)["documents"]
+            self.add_many((chunk_id, document["text"]) for chunk_id, document in documents.items())
+        os.remove(legacy_path)
+
+    def __len__(self):
+        with closing(connect(self.path)) as conn:
+            return conn.execute("SELECT chunks FROM totals").fetchone()[0]
+
+    def fingerprint(self) -> str:
+        """Changes whenever any chunk is added, removed or edited"""
+        with closing(connect(self.path)) as conn:
+            return conn.execute("SELECT fingerprint FROM totals").fetchone()[0]
+
+    def digests(self, chunk_ids) -> dict:
+        """chunk_digest() of each indexed chunk among `chunk_ids`"""
+        chunk_ids = list(chunk_ids)
+        found = {}
+        with closing(connect(self.path)) as conn:
+            for i in range(0, len(chunk_ids), 500):
+                batch = chunk_ids[i:i + 500]
+                found.update(conn.execute(
+                    f"SELECT chunk_id, digest FROM chunks WHERE chunk_id IN ({', '.join('?' * len(batch))})",
+                    batch,
+                ))
+        return found
+
+    def add_many(self, chunks):
+        """Index (chunk_id, text) pairs, replacing any chunk already indexed"""
+        with closing(connect(self.path)) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for chunk_id, text in chunks:
+                digest = chunk_digest(chunk_id, text)
+                row = conn.execute("SELECT digest FROM chunks WHERE chunk_id = ?", (chunk_id,)).fetchone()
+                if row is not None:
+                    if row[0] == digest:
+                        continue
+                    self._remove(conn, chunk_id)
+                counts = Counter(tokenize(text))
+                conn.executemany(
+                    "INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)",
+                    [(term, chunk_id, tf) for term, tf in counts.items()],
+                )
+                length = sum(counts.values())
+                conn.execute("INSERT INTO chunks VALUES (?, ?, ?)", (chunk_id, length, digest))
+                fingerprint = conn.execute("SELECT fingerprint FROM totals").fetchone()[0]
+                conn.execute(
+                    "UPDATE totals SET chunks = chunks + 1, length = length + ?, fingerprint = ?",
+                    (length, _xor(fingerprint, digest)),
+                )
+            conn.execute("COMMIT")
+
+    def remove_many(self, chunk_ids):
+        with closing(connect(self.path)) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            for chunk_id in chunk_ids:
+                self._remove(conn, chunk_id)
+            conn.execute("COMMIT")
+
+    @staticmethod
+    def _remove(conn, chunk_id: str):
+        row = conn.execute("SELECT length, digest FROM chunks WHERE chunk_id = ?", (chunk_id,)).fetchone()
+        if row is None:
+            return
+        length, digest = row
+        conn.execute("DELETE FROM postings WHERE chunk_id = ?", (chunk_id,))
+        conn.execute("DELETE FROM chunks WHERE chunk_id = ?", (chunk_id,))
+        fingerprint = conn.execute("SELECT fingerprint FROM totals").fetchone()[0]
+        conn.execute(
+            "UPDATE totals SET chunks = chunks - 1, length = length - ?, fingerprint = ?",
+            (length, _xor(fingerprint, digest)),
+        )
+
+    def search(self, query: str, k: int = 5) -> list[tuple[str, float]]:
+        """Return the k best (chunk_id, score) pairs for a query"""
+        terms = sorted(set(tokenize(query)))
+        if not terms:
+            return []
+        with closing(connect(self.path)) as conn:
+            n, total_length = conn.execute("SELECT chunks, length FROM totals").fetchone()
+            if not n:
+                return []
+            rows = conn.execute(
+                f"SELECT p.term, p.chunk_id, p.tf, c.length FROM postings p JOIN chunks c USING (chunk_id) "
+                f"WHERE p.term IN ({', '.join('?' * len(terms))})",
+                terms,
+            ).fetchall()
+        avg_length = total_length / n or 1
+        frequencies = Counter(term for term, _chunk_id, _tf, _length in rows)
+        scores = Counter()
+        for term, chunk_id, tf, length in rows:
+            df = frequencies[term]
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * length / avg_length)
+            scores[chunk_id] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import time
+from contextlib import closing
+import metrics
+from sqlite_store import CACHE_DIR, connect, create_tables
+
+
+LLM_CACHE_PATH = os.path.join(CACHE_DIR, "llm.sqlite3")
+LLM_CACHE_MAX_BYTES = int(os.environ.get("LLM_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_by_last_used ON responses (last_used);
+"""
+
+
+def llm_cache_enabled() -> bool:
+    return os.environ.get("LLM_CACHE", "1").lower() not in ("0", "false", "no")
+
+
+class PromptCache:
+    """Completed responses keyed by a hash of model, parameters and prompt.
+
+    A single SQLite file in WAL mode, so every process on the machine
+    (Streamlit workers, pool refillers) shares it. Once the stored
+    responses exceed `max_bytes`, the least recently used are evicted.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, max_bytes: int = LLM_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        create_tables(path, SCHEMA)
+
+    @staticmethod
+    def key(params: dict, prompt: str) -> str:
+        data = json.dumps({"params": params, "prompt": prompt}, sort_keys=True, default=str)
+        return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        with closing(connect(self.path)) as conn:
+            row = conn.execute("SELECT response FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+        return row[0] if row else None
+
+    def put(self, key: str, model: str, response: str):
+        now = time.time()
+        with closing(connect(self.path)) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now),
+            )
+            # Keep the most recently used responses that fit in max_bytes.
+            evicted = conn.execute(
+                "DELETE FROM responses WHERE key IN ("
+                "SELECT key FROM (SELECT key, SUM(size) OVER (ORDER BY last_used DESC) AS total "
+                "FROM responses) WHERE total > ?)",
+                (self.max_bytes,),
+            ).rowcount
+            conn.execute("COMMIT")
+        if evicted:
+            metrics.increment("llm_cache.evicted", evicted)
+
+    def clear(self):
+        with closing(connect(self.path)) as conn:
+            conn.execute("DELETE FROM responses")
+
+
+class CachedLLM:
+    """Wrap an LLM so identical requests are answered from the prompt cache.
+
+    invoke() and stream() take `cache=False` for requests that should
+    produce something new each time (fresh quizzes, retries). Without a
+    cache (LLM_CACHE=0) every call goes to the model.
+    """
+
+    def __init__(self, llm, cache: PromptCache = None):
+        self.llm = llm
+        self.cache = cache
+
+    @property
+    def model(self) -> str:
+        return self.llm.model
+
+    def _key(self, prompt: str) -> str:
+        return PromptCache.key(dict(self.llm._identifying_params), prompt)
+
+    def cached(self, prompt: str):
+        """The stored response to `prompt`, or None; no model call"""
+        if self.cache is None:
+            return None
+        response = self.cache.get(self._key(prompt))
+        if response is not None:
+            metrics.increment("llm_cache.hit")
+        return response
+
+    def invoke(self, prompt: str, cache: bool = True) -> str:
+        if self.cache is None or not cache:
+            return self.llm.invoke(prompt)
+        response = self.cached(prompt)
+        if response is not None:
+            return response
+        metrics.increment("llm_cache.miss")
+        key = self._key(prompt)
+        response = self.llm.invoke(prompt)
+        self.cache.put(key, self.model, response)
+        return response
+
+    def stream(self, prompt: str, cache: bool = True):
+        if self.cache is None or not cache:
+            yield from self.llm.stream(prompt)
+            return
+        response = self.cached(prompt)
+        if response is not None:
+            yield response
+            return
+        metrics.increment("llm_cache.miss")
+        key = self._key(prompt)
+        chunks = []
+        for chunk in self.llm.stream(prompt):
+            chunks.append(chunk)
+            yield chunk
+        # Only responses that streamed to the end are stored.
+        self.cache.put(key, self.model, "".join(chunks))
@@ -0,0 +1,231 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import closing
+from functools import lru_cache
+import metrics
+
+
+# Lower runs first.
+PRIORITY_INTERACTIVE = 0  # Q&A and feedback, a user is reading along
+PRIORITY_QUIZ = 1  # quiz generation a user is waiting for
+PRIORITY_BACKGROUND = 2  # pool refills
+
+MAX_CONCURRENT = int(os.environ.get("LLM_MAX_CONCURRENCY", 2))
+MAX_QUEUE = int(os.environ.get("LLM_MAX_QUEUE", 16))
+
+
+class SchedulerOverloaded(RuntimeError):
+    pass
+
+
+class _Flight:
+    """One in-flight generation whose chunks several callers can read"""
+
+    def __init__(self, priority: int):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.cond = threading.Condition()
+        # Best priority among the callers; the scheduler's lock guards both.
+        self.priority = priority
+        self.readers = 0
+        # Its place in the scheduler's queue while it waits for a slot
+        self.waiting = None
+
+    def append(self, chunk: str):
+        with self.cond:
+            self.chunks.append(chunk)
+            self.cond.notify_all()
+
+    def finish(self, error: BaseException = None):
+        with self.cond:
+            self.done = True
+            self.error = error
+            self.cond.notify_all()
+
+    def follow(self):
+        position = 0
+        while True:
+            with self.cond:
+                while position >= len(self.chunks) and not self.done:
+                    self.cond.wait()
+                if position < len(self.chunks):
+                    chunk = self.chunks[position]
+                    position += 1
+                elif self.error is not None:
+                    raise self.error
+                else:
+                    return
+            yield chunk
+
+
+class LLMScheduler:
+    """Queue in front of the model shared by every session in the process.
+
+    At most `max_concurrent` generations run at once; the rest wait in a
+    priority queue (interactive before quiz before background work). When
+    `max_queue` requests are already waiting, new ones are rejected with
+    SchedulerOverloaded, and background work is shed at half that depth.
+    Identical cacheable requests that arrive while one is running share
+    its output instead of generating it again; the shared generation runs
+    on its own thread until the last of them stops reading, and waits in
+    the queue at the best priority among them. Requests made with
+    cache=False want a different answer and are never merged. `llm` is a
+    CachedLLM: prompt cache hits are answered before taking a slot.
+    """
+
+    def __init__(self, llm, max_concurrent: int = MAX_CONCURRENT, max_queue: int = MAX_QUEUE):
+        self.llm = llm
+        self.max_concurrent = max(1, max_concurrent)
+        self.max_queue = max_queue
+        self._lock = threading.Lock()
+        self._waiting = []
+        self._seq = itertools.count()
+        self._active = 0
+        self._flights = {}
+
+    @property
+    def model(self) -> str:
+        return self.llm.model
+
+    def client(self, priority: int) -> "ScheduledLLM":
+        return ScheduledLLM(self, priority)
+
+    def _update_gauges(self):
+        metrics.set_gauge("llm_scheduler.queue_depth", len(self._waiting))
+        metrics.set_gauge("llm_scheduler.active", self._active)
+
+    def _acquire(self, priority: int, flight: _Flight = None):
+        start = time.monotonic()
+        with self._lock:
+            if flight is not None:
+                # Callers that joined since the flight started may have raised it.
+                priority = flight.priority
+            if self._active < self.max_concurrent and not self._waiting:
+                self._active += 1
+                self._update_gauges()
+                metrics.observe("llm_scheduler.wait_seconds", 0.0)
+                return
+            limit = self.max_queue if priority < PRIORITY_BACKGROUND else self.max_queue // 2
+            if len(self._waiting) >= limit:
+                metrics.increment("llm_scheduler.shed")
+                raise SchedulerOverloaded(
+                    f"QuizBot is busy: {len(self._waiting)} requests are waiting for the model. "
+                    "Please try again in a moment."
+                )
+            ready = threading.Event()
+            entry = [priority, next(self._seq), ready]
+            heapq.heappush(self._waiting, entry)
+            if flight is not None:
+                flight.waiting = entry
+            self._update_gauges()
+        ready.wait()
+        if flight is not None:
+            with self._lock:
+                flight.waiting = None
+        metrics.observe("llm_scheduler.wait_seconds", time.monotonic() - start)
+
+    def _release(self):
+        with self._lock:
+            if self._waiting:
+                # Hand the slot straight to the next request in line.
+                _priority, _seq, ready = heapq.heappop(self._waiting)
+                ready.set()
+            else:
+                self._active -= 1
+            self._update_gauges()
+
+    def _generate(self, prompt: str, cache: bool, priority: int, flight: _Flight = None):
+        self._acquire(priority, flight)
+        try:
+            yield from self.llm.stream(prompt, cache=cache)
+        finally:
+            self._release()
+
+    def _run_flight(self, prompt: str, flight: _Flight):
+        """Generate for every caller merged onto `flight`, until none is left reading"""
+        try:
+            with closing(self._generate(prompt, True, flight.priority, flight)) as chunks:
+                for chunk in chunks:
+                    flight.append(chunk)
+                    with self._lock:
+                        if not flight.readers:
+                            # Later identical requests start afresh.
+                            self._flights.pop(prompt, None)
+                            metrics.increment("llm_scheduler.abandoned")
+                            break
+        except BaseException as e:
+            flight.finish(e)
+        else:
+            flight.finish()
+        finally:
+            with self._lock:
+                if self._flights.get(prompt) is flight:
+                    del self._flights[prompt]
+
+    def _join(self, prompt: str, priority: int) -> _Flight:
+        with self._lock:
+            flight = self._flights.get(prompt)
+            if flight is None:
+                flight = self._flights[prompt] = _Flight(priority)
+                threading.Thread(
+                    target=self._run_flight, args=(prompt, flight), name="llm-flight", daemon=True
+                ).start()
+            else:
+                metrics.increment("llm_scheduler.coalesced")
+                if priority < flight.priority:
+                    flight.priority = priority
+                    if flight.waiting is not None:
+                        # Move it up the queue with the new caller.
+                        flight.waiting[0] = priority
+                        heapq.heapify(self._waiting)
+            flight.readers += 1
+        return flight
+
+    def stream(self, prompt: str, cache: bool = True, priority: int = PRIORITY_QUIZ):
+        if not cache:
+            yield from self._generate(prompt, cache, priority)
+            return
+        # A cached response needs no model slot, so it never queues or is shed.
+        response = self.llm.cached(prompt)
+        if response is not None:
+            yield response
+            return
+        flight = self._join(prompt, priority)
+        try:
+            yield from flight.follow()
+        finally:
+            with self._lock:
+                flight.readers -= 1
+
+    def invoke(self, prompt: str, cache: bool = True, priority: int = PRIORITY_QUIZ) -> str:
+        return "".join(self.stream(prompt, cache, priority))
+
+
+class ScheduledLLM:
+    """The model as seen by one kind of caller: invoke/stream at a fixed priority"""
+
+    def __init__(self, scheduler: LLMScheduler, priority: int):
+        self.scheduler = scheduler
+        self.priority = priority
+
+    @property
+    def model(self) -> str:
+        return self.scheduler.model
+
+    def invoke(self, prompt: str, cache: bool = True) -> str:
+        return self.scheduler.invoke(prompt, cache, self.priority)
+
+    def stream(self, prompt: str, cache: bool = True):
+        return self.scheduler.stream(prompt, cache, self.priority)
+
+
+@lru_cache(maxsize=1)
+def get_scheduler() -> LLMScheduler:
+    """The process-wide scheduler around the cached model client"""
+    from quiz_generator import create_model
+
+    return LLMScheduler(create_model())
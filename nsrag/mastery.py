@@ -0,0 +1,57 @@
+import os
+import random
+from topics import TOPICS
+
+
+# Weight of the latest quiz in a topic's exponentially weighted accuracy.
+MASTERY_ALPHA = float(os.environ.get("MASTERY_ALPHA", 0.3))
+# Assumed accuracy on a topic the user has not been quizzed on yet.
+PRIOR_SCORE = 0.5
+# Unseen and rarely seen topics get up to this much extra weight.
+EXPLORATION = 0.3
+# Mastered topics still come up now and then.
+MIN_WEIGHT = 0.05
+# Mean mastery of the chosen topics below EASY_BELOW gives Easy, from HARD_FROM Hard.
+EASY_BELOW = 0.5
+HARD_FROM = 0.8
+
+
+def updated_score(score: float, accuracy: float, alpha: float = MASTERY_ALPHA) -> float:
+    """A topic's mastery after one more graded quiz at `accuracy` (0-1)"""
+    return score + alpha * (accuracy - score)
+
+
+def topic_weight(mastery: dict, topic: str) -> float:
+    score, quizzes = mastery.get(topic, (PRIOR_SCORE, 0))
+    return max(MIN_WEIGHT, 1 - score + EXPLORATION / (1 + quizzes))
+
+
+def choose_topics(mastery: dict, count: int = 2, topics: list[str] = TOPICS, rng=random) -> list[str]:
+    """Sample `count` topics, favouring weak and unexplored ones.
+
+    `mastery` maps topic to (score, quizzes) as kept by HistoryStore.
+    Weighted sampling without replacement (Efraimidis-Spirakis keys), so
+    a weak topic is likely but not certain to come up.
+    """
+    keys = [(rng.random() ** (1 / topic_weight(mastery, topic)), topic) for topic in topics]
+    keys.sort(reverse=True)
+    return [topic for _key, topic in keys[:count]]
+
+
+def suggest_difficulty(mastery: dict, topics: list[str], default: str = "Medium") -> str:
+    """Easy, Medium or Hard from the user's mastery of the quiz topics"""
+    scores = [mastery[topic][0] for topic in topics if topic in mastery]
+    if not scores:
+        return default
+    score = sum(scores) / len(scores)
+    if score < EASY_BELOW:
+        return "Easy"
+    if score >= HARD_FROM:
+        return "Hard"
+    return "Medium"
+
+
+def weakest_topics(mastery: dict, limit: int = 3) -> list[tuple[str, float]]:
+    """The user's lowest scoring topics seen so far, weakest first"""
+    ranked = sorted((score, topic) for topic, (score, _quizzes) in mastery.items())
+    return [(topic, score) for score, topic in ranked[:limit]]
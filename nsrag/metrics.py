@@ -0,0 +1,58 @@
+import threading
+from collections import defaultdict
+
+
+_lock = threading.Lock()
+_counters = defaultdict(int)
+_gauges = {}
+# name -> [count, total, max]
+_observations = {}
+
+
+def increment(name: str, value: int = 1):
+    with _lock:
+        _counters[name] += value
+
+
+def counter(name: str) -> int:
+    with _lock:
+        return _counters[name]
+
+
+def set_gauge(name: str, value: float):
+    with _lock:
+        _gauges[name] = value
+
+
+def gauge(name: str, default: float = 0):
+    with _lock:
+        return _gauges.get(name, default)
+
+
+def observe(name: str, value: float):
+    """Record one sample of a distribution such as a wait time"""
+    with _lock:
+        stats = _observations.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += value
+        stats[2] = max(stats[2], value)
+
+
+def hit_rate(prefix: str):
+    """Share of `<prefix>.hit` among hits and misses, or None before any lookup"""
+    with _lock:
+        hits = _counters[f"{prefix}.hit"]
+        total = hits + _counters[f"{prefix}.miss"]
+    return hits / total if total else None
+
+
+def snapshot() -> dict:
+    """Current value of every metric in this process"""
+    with _lock:
+        values = dict(_counters)
+        values.update(_gauges)
+        for name, (count, total, peak) in _observations.items():
+            values[f"{name}.count"] = count
+            values[f"{name}.mean"] = total / count
+            values[f"{name}.max"] = peak
+        return values
@@ -0,0 +1,110 @@
+import gzip
+import json
+import os
+
+
+NSRAG_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(NSRAG_DIR, "data")
+CACHE_PATH = os.path.join(NSRAG_DIR, "cache")
+TEXT_CACHE_FILE = os.path.join(CACHE_PATH, "pdf_text.json.gz")
+PAGE_SEPARATOR = "\n\n---\n\n"
+
+
+def list_pdfs(data_path: str = DATA_PATH) -> list[str]:
+    pdfs = []
+    for root, _dirs, files in os.walk(data_path):
+        for name in files:
+            if name.lower().endswith(".pdf") and not name.startswith("."):
+                pdfs.append(os.path.join(root, name))
+    return sorted(pdfs)
+
+
+def file_fingerprint(path: str) -> dict:
+    stat = os.stat(path)
+    return {"mtime": stat.st_mtime, "size": stat.st_size}
+
+
+class PageTextCache:
+    """Extracted page text per PDF, keyed by path, mtime and size"""
+
+    def __init__(self, cache_file: str = TEXT_CACHE_FILE):
+        self.cache_file = cache_file
+        self.entries = {}
+        self.dirty = False
+        try:
+            with gzip.open(cache_file, "rt", encoding="utf-8") as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+
+    def pages(self, path: str) -> list[str]:
+        """Cached pages for a file, or [] if the file changed since caching"""
+        entry = self.entries.get(path)
+        if entry and file_fingerprint(path) == {"mtime": entry["mtime"], "size": entry["size"]}:
+            return entry["pages"]
+        return []
+
+    def is_complete(self, path: str) -> bool:
+        entry = self.entries.get(path)
+        return bool(entry and entry.get("complete") and self.pages(path))
+
+    def store(self, path: str, pages: list[str], complete: bool):
+        self.entries[path] = {**file_fingerprint(path), "pages": pages, "complete": complete}
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        os.makedirs(os.path.dirname(self.cache_file), exist_ok=True)
+        tmp_file = f"{self.cache_file}.{os.getpid()}.tmp"
+        with gzip.open(tmp_file, "wt", encoding="utf-8") as f:
+            json.dump(self.entries, f, separators=(",", ":"))
+        os.replace(tmp_file, self.cache_file)
+        self.dirty = False
+
+
+def iter_pdf_pages(data_path: str = DATA_PATH, cache: PageTextCache = None):
+    """Yield (path, page_number, text) one page at a time.
+
+    Pages already in the cache are served without opening the PDF; the rest
+    are parsed lazily, so a consumer that stops early never pays for the
+    remaining pages or files.
+    """
+    for path in list_pdfs(data_path):
+        cached = cache.pages(path) if cache else []
+        for page_number, text in enumerate(cached):
+            yield path, page_number, text
+        if cache and cache.is_complete(path):
+            continue
+
+        from pypdf import PdfReader
+
+        reader = PdfReader(path)
+        pages = list(cached)
+        try:
+            for page_number in range(len(cached), len(reader.pages)):
+                text = reader.pages[page_number].extract_text() or ""
+                pages.append(text)
+                yield path, page_number, text
+        finally:
+            # Record whatever was extracted, even if the consumer stopped early.
+            if cache:
+                cache.store(path, pages, complete=len(pages) == len(reader.pages))
+
+
+def load_pdf_text(data_path: str = DATA_PATH, max_pages: int = 50, max_chars: int = None) -> str:
+    """Join the first pages of the corpus, stopping once enough text is read"""
+    cache = PageTextCache()
+    texts = []
+    total_chars = 0
+    pages = iter_pdf_pages(data_path, cache)
+    try:
+        for _path, _page_number, text in pages:
+            texts.append(text)
+            total_chars += len(text) + len(PAGE_SEPARATOR)
+            if len(texts) >= max_pages or (max_chars and total_chars >= max_chars):
+                break
+    finally:
+        pages.close()
+        cache.save()
+    return PAGE_SEPARATOR.join(texts)
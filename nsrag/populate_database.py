@@ -1,15 +1,26 @@
 import argparse
+import hashlib
+import json
 import os
 import shutil
-from langchain_community.document_loaders.pdf import PyPDFDirectoryLoader
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from langchain_community.document_loaders.pdf import PyPDFDirectoryLoader, PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from get_embedding_function import get_embedding_function
+from keyword_index import BM25Index, chunk_digest, index_path
+from pdf_loader import list_pdfs
+from topic_packs import refresh_topic_packs
 from langchain_community.vectorstores.chroma import Chroma
 
 
 CHROMA_PATH = "chroma"
 DATA_PATH = "data"
+MANIFEST_PATH = os.path.join(CHROMA_PATH, "manifest.json")
+KEYWORD_INDEX_PATH = index_path(CHROMA_PATH)
+BATCH_SIZE = 256
+
+_keyword_index = None
 
 
 def main():
@@ -17,15 +28,34 @@ def main():
     # Check if the database should be cleared (using the --clear flag).
     parser = argparse.ArgumentParser()
     parser.add_argument("--reset", action="store_true", help="Reset the database.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Parse PDFs across this many processes while embedding.",
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Only re-process changed PDFs and remove chunks of deleted ones.",
+    )
     args = parser.parse_args()
     if args.reset:
         print("✨ Clearing Database")
         clear_database()
 
     # Create (or update) the data store.
-    documents = load_documents()
-    chunks = split_documents(documents)
-    add_to_chroma(chunks)
+    if args.sync:
+        sync_database(args.workers)
+    elif args.workers > 1:
+        ingest_parallel(args.workers)
+    else:
+        documents = load_documents()
+        chunks = split_documents(documents)
+        add_to_chroma(chunks)
+
+    # Rebuild the per-topic context packs if the corpus changed.
+    refresh_topic_packs(CHROMA_PATH)
 
 
 def load_documents():
@@ -33,6 +63,178 @@ def load_documents():
     return document_loader.load()
 
 
+def load_pdf(path: str):
+    return PyPDFLoader(path).load()
+
+
+def iter_documents_parallel(workers: int, pdf_paths: list[str] = None):
+    # Yield (path, pages) for each PDF as soon as a worker finishes parsing it.
+    if pdf_paths is None:
+        pdf_paths = list_pdfs(DATA_PATH)
+    if workers <= 1:
+        for path in pdf_paths:
+            try:
+                yield path, load_pdf(path)
+            except Exception as e:
+                print(f"⚠️  Skipping {path}: {e}")
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(load_pdf, path): path for path in pdf_paths}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                print(f"⚠️  Skipping {futures[future]}: {e}")
+
+
+def ingest_parallel(workers: int):
+    # Splitting and embedding run in this process while the pool keeps
+    # parsing the remaining PDFs, so the two stages overlap.
+    db = get_db()
+    for _path, documents in iter_documents_parallel(workers):
+        chunks = split_documents(documents)
+        add_to_chroma(chunks, db)
+
+
+def file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def load_manifest() -> dict:
+    # Maps each ingested PDF to its content hash and chunk IDs.
+    if not os.path.exists(MANIFEST_PATH):
+        return {}
+    with open(MANIFEST_PATH) as f:
+        return json.load(f)
+
+
+def save_manifest(manifest: dict):
+    os.makedirs(CHROMA_PATH, exist_ok=True)
+    tmp_path = f"{MANIFEST_PATH}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def scan_changed_files(manifest: dict):
+    # Hash only files whose size or mtime moved since the last sync.
+    current = {}
+    changed = []
+    for path in list_pdfs(DATA_PATH):
+        stat = os.stat(path)
+        entry = manifest.get(path)
+        if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+            current[path] = entry
+            continue
+        digest = file_hash(path)
+        current[path] = {"hash": digest, "size": stat.st_size, "mtime": stat.st_mtime}
+        if entry and entry["hash"] == digest:
+            # Touched but not modified.
+            current[path]["ids"] = entry["ids"]
+        else:
+            changed.append(path)
+    removed = [path for path in manifest if path not in current]
+    return current, changed, removed
+
+
+def stored_sources(db) -> set[str]:
+    # Every PDF with chunks in Chroma, read one page of metadata at a time.
+    sources = set()
+    offset = 0
+    while True:
+        metadatas = db.get(include=["metadatas"], limit=BATCH_SIZE, offset=offset)["metadatas"]
+        if not metadatas:
+            return sources
+        sources.update(metadata.get("source") for metadata in metadatas if metadata)
+        offset += len(metadatas)
+
+
+def known_chunk_ids(db, manifest: dict, path: str) -> list[str]:
+    if path in manifest:
+        return manifest[path]["ids"]
+    # Ingested before the manifest existed (e.g. by a plain run).
+    return db.get(where={"source": path}, include=[])["ids"]
+
+
+def delete_chunks(db, ids: list[str]):
+    ids = list(ids)
+    keyword_index = get_keyword_index()
+    for i in range(0, len(ids), BATCH_SIZE):
+        db.delete(ids=ids[i : i + BATCH_SIZE])
+        keyword_index.remove_many(ids[i : i + BATCH_SIZE])
+
+
+def sync_database(workers: int = 1):
+    db = get_db()
+    manifest = load_manifest()
+    first_sync = not manifest
+    current, changed, removed = scan_changed_files(manifest)
+    summary = {
+        "files_added": 0,
+        "files_updated": 0,
+        "files_removed": 0,
+        "chunks_added": 0,
+        "chunks_updated": 0,
+        "chunks_removed": 0,
+    }
+
+    for path in removed:
+        stale_ids = manifest.pop(path)["ids"]
+        delete_chunks(db, stale_ids)
+        summary["files_removed"] += 1
+        summary["chunks_removed"] += len(stale_ids)
+    if first_sync:
+        # First sync: PDFs ingested by a plain run and deleted since then
+        # are not in the manifest, only in Chroma.
+        for path in sorted(stored_sources(db) - set(current) - {None}):
+            stale_ids = db.get(where={"source": path}, include=[])["ids"]
+            delete_chunks(db, stale_ids)
+            summary["files_removed"] += 1
+            summary["chunks_removed"] += len(stale_ids)
+    for path, entry in current.items():
+        if path not in changed:
+            manifest[path] = entry
+    save_manifest(manifest)
+
+    for path, documents in iter_documents_parallel(workers, changed):
+        old_ids = set(known_chunk_ids(db, manifest, path))
+        chunks = calculate_chunk_ids(split_documents(documents))
+        new_ids = [chunk.metadata["id"] for chunk in chunks]
+
+        stale_ids = old_ids - set(new_ids)
+        delete_chunks(db, stale_ids)
+        # Only chunks whose text changed are re-embedded and counted as updated.
+        stored = get_keyword_index().digests(old_ids & set(new_ids))
+        changed_chunks = [
+            chunk for chunk in chunks
+            if stored.get(chunk.metadata["id"]) != chunk_digest(chunk.metadata["id"], chunk.page_content)
+        ]
+        add_in_batches(db, changed_chunks)
+
+        summary["files_updated" if old_ids else "files_added"] += 1
+        summary["chunks_added"] += len(set(new_ids) - old_ids)
+        summary["chunks_updated"] += sum(chunk.metadata["id"] in old_ids for chunk in changed_chunks)
+        summary["chunks_removed"] += len(stale_ids)
+
+        # Saved per file so an interrupted sync resumes where it stopped.
+        manifest[path] = {**current[path], "ids": new_ids}
+        save_manifest(manifest)
+
+    print(
+        f"📄 Files: {summary['files_added']} added, {summary['files_updated']} updated, "
+        f"{summary['files_removed']} removed"
+    )
+    print(
+        f"🧩 Chunks: {summary['chunks_added']} added, {summary['chunks_updated']} updated, "
+        f"{summary['chunks_removed']} removed"
+    )
+    return summary
+
+
 def split_documents(documents: list[Document]):
     text_splitter = RecursiveCharacterTextSplitter(
         chunk_size=800,
@@ -43,35 +245,64 @@ def split_documents(documents: list[Document]):
     return text_splitter.split_documents(documents)
 
 
-def add_to_chroma(chunks: list[Document]):
-    # Load the existing database.
-    db = Chroma(
+def get_db():
+    return Chroma(
         persist_directory=CHROMA_PATH, embedding_function=get_embedding_function()
     )
 
+
+def get_keyword_index():
+    # Opened lazily so --reset has already removed the old copy.
+    global _keyword_index
+    if _keyword_index is None:
+        _keyword_index = BM25Index(KEYWORD_INDEX_PATH)
+    return _keyword_index
+
+
+def add_to_chroma(chunks: list[Document], db=None):
+    # Load the existing database.
+    if db is None:
+        db = get_db()
+
     # Calculate Page IDs.
     chunks_with_ids = calculate_chunk_ids(chunks)
 
-    # Add or Update the documents.
-    existing_items = db.get(include=[])  # IDs are always included by default
-    existing_ids = set(existing_items["ids"])
-    print(f"Number of existing documents in DB: {len(existing_ids)}")
-
-    # Only add documents that don't exist in the DB.
-    new_chunks = []
-    for chunk in chunks_with_ids:
-        if chunk.metadata["id"] not in existing_ids:
-            new_chunks.append(chunk)
-
-    if len(new_chunks):
-        print(f"👉 Adding new documents: {len(new_chunks)}")
-        new_chunk_ids = [chunk.metadata["id"] for chunk in new_chunks]
-        db.add_documents(new_chunks, ids=new_chunk_ids)
+    # Only add documents that don't exist in the DB, checking one batch of
+    # candidate IDs at a time instead of loading every stored ID.
+    added = 0
+    for i in range(0, len(chunks_with_ids), BATCH_SIZE):
+        batch = chunks_with_ids[i : i + BATCH_SIZE]
+        batch_ids = [chunk.metadata["id"] for chunk in batch]
+        existing_ids = set(db.get(ids=batch_ids, include=[])["ids"])
+        new_chunks = [
+            chunk for chunk in batch if chunk.metadata["id"] not in existing_ids
+        ]
+        if new_chunks:
+            add_in_batches(db, new_chunks)
+            added += len(new_chunks)
+
+        # Backfill the keyword index for chunks stored before it existed;
+        # chunks it already holds unchanged are skipped.
+        get_keyword_index().add_many(
+            (chunk.metadata["id"], chunk.page_content) for chunk in batch
+        )
+
+    if added:
+        print(f"👉 Added new documents: {added}")
         db.persist()
     else:
         print("✅ No new documents to add")
 
 
+def add_in_batches(db, chunks: list[Document]):
+    # Chroma upserts, so this both adds new IDs and overwrites existing ones.
+    keyword_index = get_keyword_index()
+    for i in range(0, len(chunks), BATCH_SIZE):
+        batch = chunks[i : i + BATCH_SIZE]
+        db.add_documents(batch, ids=[chunk.metadata["id"] for chunk in batch])
+        keyword_index.add_many((chunk.metadata["id"], chunk.page_content) for chunk in batch)
+
+
 def calculate_chunk_ids(chunks):
 
     # This will create IDs like "data/monopoly.pdf:6:2"
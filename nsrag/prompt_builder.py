@@ -0,0 +1,191 @@
+import re
+from typing import NamedTuple
+from prompt_templates import EVAL_QUIZ_MCQ_TOPIC_PROMPT, EVAL_QUIZ_TF_TOPIC_PROMPT
+from quiz_parser import MCQ
+
+
+# Context window requested from Ollama (num_ctx) and the share of it kept
+# free for the model's answer, per request type.
+CONTEXT_WINDOW = 4096
+OUTPUT_RESERVE = {
+    "quiz": 1536,
+    "evaluation": 1024,
+    "qa": 768,
+}
+# Longest text the splitter repeats between neighbouring chunks
+# (chunk_overlap in populate_database.py).
+CHUNK_OVERLAP = 80
+MIN_OVERLAP = 16
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+
+_PIECE_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+
+def count_tokens(text: str) -> int:
+    """Approximate llama token count: one per word or symbol, plus one per
+    extra 4 characters in long words."""
+    return sum(1 + (len(piece) - 1) // 4 for piece in _PIECE_PATTERN.findall(text))
+
+
+def token_budget(request_type: str) -> int:
+    """Prompt tokens available for a request type"""
+    return CONTEXT_WINDOW - OUTPUT_RESERVE[request_type]
+
+
+class PackedContext(NamedTuple):
+    text: str
+    tokens: int
+    chunk_ids: list
+
+
+class Prompt(NamedTuple):
+    text: str
+    tokens: int
+    context_tokens: int
+    chunk_ids: list
+
+
+def _overlap(head: str, tail: str) -> int:
+    # Length of the longest suffix of `head` that is also a prefix of `tail`.
+    for n in range(min(len(head), len(tail), CHUNK_OVERLAP), MIN_OVERLAP - 1, -1):
+        if head.endswith(tail[:n]):
+            return n
+    return 0
+
+
+def pack_context(results, budget: int) -> PackedContext:
+    """Pack whole chunks, most relevant first, until the budget is full.
+
+    Text that a chunk shares with an already packed neighbour (the splitter
+    overlap) is trimmed, and chunks that add nothing new are skipped.
+    """
+    separator_tokens = count_tokens(CONTEXT_SEPARATOR)
+    texts = []
+    chunk_ids = []
+    used = 0
+    for doc, _score in results:
+        chunk_id = doc.metadata.get("id")
+        if chunk_id is not None and chunk_id in chunk_ids:
+            continue
+        text = doc.page_content.strip()
+        for packed in texts:
+            if text in packed:
+                text = ""
+                break
+            text = text[_overlap(packed, text):]
+            cut = _overlap(text, packed)
+            if cut:
+                text = text[:-cut]
+            text = text.strip()
+        if not text:
+            continue
+        tokens = count_tokens(text) + (separator_tokens if texts else 0)
+        if used + tokens > budget:
+            # Keep trying: a later, shorter chunk may still fit.
+            continue
+        texts.append(text)
+        chunk_ids.append(chunk_id)
+        used += tokens
+    return PackedContext(CONTEXT_SEPARATOR.join(texts), used, chunk_ids)
+
+
+def get_difficulty_context(difficulty):
+    """Get context modifier based on difficulty"""
+    if difficulty == "Easy":
+        return "Generate straightforward questions with clear, direct answers."
+    elif difficulty == "Hard":
+        return "Generate challenging questions that require deep understanding and critical thinking."
+    else:
+        return "Generate moderately challenging questions."
+
+
+def _topic_text(topics):
+    if len(topics) > 1:
+        return f"on the topics: {', '.join(topics)}"
+    return f"on the topic: {topics[0]}"
+
+
+def _with_context(request_type: str, instructions, results, render) -> Prompt:
+    # Whatever the fixed part of the prompt leaves is the context budget.
+    fixed_tokens = count_tokens(render("", instructions))
+    context = pack_context(results, max(0, token_budget(request_type) - fixed_tokens))
+    text = render(context.text, instructions)
+    return Prompt(text, count_tokens(text), context.tokens, context.chunk_ids)
+
+
+def _avoid_text(avoid):
+    if not avoid:
+        return ""
+    listed = "\n".join(f"- {question}" for question in avoid)
+    return f"\n\nDo not repeat or rephrase any of these questions:\n{listed}"
+
+
+def build_quiz_prompt(quiz_type, topics, num_questions, difficulty, results, avoid=None, focus=None):
+    """Build the quiz generation prompt within the quiz token budget"""
+    topic_text = _topic_text(topics)
+    if quiz_type == MCQ:
+        instructions = f"""{get_difficulty_context(difficulty)}
+
+Based on network security concepts, generate {num_questions} multiple-choice questions {topic_text}.
+
+Each question should have:
+- A clear question
+- 4 options labeled A, B, C, D
+- The correct answer and a one-sentence explanation
+
+Format:
+Question 1: [question text]
+A) [option]
+B) [option]
+C) [option]
+D) [option]
+Answer: [letter]
+Explanation: [one sentence]
+
+Generate the quiz now:"""
+    else:
+        instructions = f"""Based on network security concepts, generate {num_questions} true/false questions {topic_text}.
+
+Format:
+Question 1: [statement]
+Answer: [True or False]
+Explanation: [one sentence]
+
+Generate the quiz now:"""
+
+    if focus:
+        instructions = f"{instructions}\n\nFocus these questions on {focus}."
+    instructions = f"{instructions}{_avoid_text(avoid)}"
+
+    def render(context, instructions):
+        return f"Context from network security materials:\n{context}\n\n{instructions}"
+
+    return _with_context("quiz", instructions, results, render)
+
+
+def build_feedback_prompt(quiz_type, questions, user_answers, results, answer_key):
+    """Build the optional in-depth feedback prompt within the evaluation budget"""
+    template = EVAL_QUIZ_MCQ_TOPIC_PROMPT if quiz_type == MCQ else EVAL_QUIZ_TF_TOPIC_PROMPT
+    instructions = {"questions": questions, "usrAns": user_answers, "answerKey": answer_key}
+
+    def render(context, instructions):
+        return template.format(context=context, **instructions)
+
+    return _with_context("evaluation", instructions, results, render)
+
+
+def build_qa_prompt(question, results):
+    """Build the Q&A prompt within the Q&A token budget"""
+
+    def render(context, question):
+        return f"""Based on network security concepts, answer this question:
+
+Question: {question}
+
+Context from materials:
+{context}
+
+Provide a clear, detailed answer:"""
+
+    return _with_context("qa", question, results, render)
+
@@ -39,6 +39,8 @@ Perform the following task based only on the following context:
 
 You are a master quiz evaluator. The user answers (for MCQ questions with 4 options) will have the question number and option label next to it for all questions in a single line.
 For the MCQ questions in this: {questions}, evaluate the answers given by the user: {usrAns}.
+The correct answers, with why, are final and were used to grade the user; never contradict them:
+{answerKey}
 Give answer and brief explanation to each of them after evaluation.
 '''
 
@@ -51,6 +53,8 @@ Perform the following task based only on the following context:
 
 You are a master quiz evaluator. The user answers (for the true or false questions) will have the question number and answer next to it for all questions in a single line.
 For the True or False questions in this: {questions}, evaluate the answers given by the user: {usrAns}.
+The correct answers, with why, are final and were used to grade the user; never contradict them:
+{answerKey}
 Provide a brief explanation for each answer after evaluation.
 '''
 
@@ -76,6 +80,8 @@ Perform the following task based only on the following context:
 
 You are a master quiz evaluator. The user answers (for MCQ questions with 4 options) will have the question number and option label next to it for all questions in a single line.
 For the MCQ questions in this: {questions}, evaluate the answers given by the user: {usrAns}.
+The correct answers, with why, are final and were used to grade the user; never contradict them:
+{answerKey}
 Give answer and brief explanation to each of them after evaluation.
 '''
 
@@ -101,5 +107,7 @@ Perform the following task based only on the following context:
 
 You are a master quiz evaluator. The user answers (for the true or false questions) will have the question number and answer next to it for all questions in a single line.
 For the True or False questions in this: {questions}, evaluate the answers given by the user: {usrAns}.
+The correct answers, with why, are final and were used to grade the user; never contradict them:
+{answerKey}
 Provide a brief explanation for each answer after evaluation.
 '''
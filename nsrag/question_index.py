@@ -0,0 +1,343 @@
+import bisect
+import hashlib
+import os
+import re
+import threading
+import time
+from contextlib import closing
+from typing import NamedTuple, Optional
+import numpy as np
+import metrics
+from sqlite_store import CACHE_DIR, connect, create_tables, normalize
+
+
+QUESTION_INDEX_PATH = os.path.join(CACHE_DIR, "questions.sqlite3")
+# Cosine similarity of question embeddings above which two questions are the same.
+SIMILARITY_THRESHOLD = float(os.environ.get("QUESTION_DUP_THRESHOLD", 0.92))
+# SimHash bits two wordings may differ in and still count as the same question.
+MAX_DISTANCE = 3
+# The 64-bit SimHash is split into this many bands for LSH lookups. With more
+# bands than MAX_DISTANCE, any two fingerprints within it share a band.
+BANDS = 4
+BAND_BITS = 64 // BANDS
+# Oldest questions are forgotten beyond this many, along with who saw them.
+MAX_QUESTIONS = int(os.environ.get("QUESTION_INDEX_MAX", 20000))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS questions (
+    id INTEGER PRIMARY KEY,
+    text TEXT NOT NULL,
+    simhash INTEGER NOT NULL,
+    embedding BLOB,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS seen (
+    user_id TEXT NOT NULL,
+    question_id INTEGER NOT NULL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (user_id, question_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS seen_by_question ON seen (question_id);
+"""
+
+
+class Fingerprint(NamedTuple):
+    simhash: int
+    # Unit-length embedding, or None when the embedding model was unavailable.
+    vector: Optional[np.ndarray]
+
+
+def normalize_text(text: str) -> str:
+    """Lower-case words of a question, without numbering or punctuation"""
+    text = re.sub(r"^\s*(question\s*\d+\s*[:.)]\s*)", "", text.lower())
+    return " ".join(re.findall(r"[a-z0-9]+", text))
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of the normalized words and word pairs of `text`"""
+    words = normalize_text(text).split()
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    counts = [0] * 64
+    for feature in features:
+        value = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=8).digest(), "big")
+        for bit in range(64):
+            counts[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(64) if counts[bit] > 0)
+
+
+def _bands(fingerprint: int) -> list[int]:
+    mask = (1 << BAND_BITS) - 1
+    return [fingerprint >> (band * BAND_BITS) & mask for band in range(BANDS)]
+
+
+def _to_sql(fingerprint: int) -> int:
+    # SQLite integers are signed 64-bit.
+    return fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+
+
+def _from_sql(value: int) -> int:
+    return value + (1 << 64) if value < 0 else value
+
+
+class _Index:
+    """The pool in memory, kept in step with the table a few rows at a time.
+
+    Positions count every row ever loaded, so they stay valid as the
+    oldest rows are dropped; row `position` is at `position - base`.
+    """
+
+    def __init__(self):
+        self.max_id = None
+        self.base = 0
+        self.ids = []
+        self.simhashes = []
+        # One {band value: [positions]} per band
+        self.bands = [{} for _band in range(BANDS)]
+        # Embeddings of one width live in buffer[start:end], with their positions alongside;
+        # the buffer doubles when full, so adding rows seldom copies the others.
+        self.buffer = np.empty((0, 0), dtype=np.float32)
+        self.positions = np.empty(0, dtype=np.int64)
+        self.start = self.end = 0
+
+    @property
+    def matrix(self) -> np.ndarray:
+        return self.buffer[self.start:self.end]
+
+    @property
+    def embedded(self) -> np.ndarray:
+        """Positions of the rows of `matrix`"""
+        return self.positions[self.start:self.end]
+
+    def add(self, rows):
+        vectors, positions = [], []
+        for row_id, value, embedding in rows:
+            position = self.base + len(self.ids)
+            fingerprint = _from_sql(value)
+            self.ids.append(row_id)
+            self.simhashes.append(fingerprint)
+            for band, key in zip(self.bands, _bands(fingerprint)):
+                band.setdefault(key, []).append(position)
+            if embedding is not None:
+                vector = np.frombuffer(embedding, dtype=np.float32)
+                if self.start == self.end and not vectors:
+                    # The first embedding sets the width; after a model change,
+                    # new questions match by wording until the old ones are evicted.
+                    self.buffer = np.empty((0, vector.shape[0]), dtype=np.float32)
+                if vector.shape[0] == self.buffer.shape[1]:
+                    vectors.append(vector)
+                    positions.append(position)
+            self.max_id = row_id
+        if vectors:
+            self._append(np.stack(vectors), positions)
+
+    def _append(self, vectors: np.ndarray, positions: list[int]):
+        live = self.end - self.start
+        if self.end + len(vectors) > len(self.buffer):
+            capacity = max(2 * (live + len(vectors)), 1024)
+            buffer = np.empty((capacity, vectors.shape[1]), dtype=np.float32)
+            buffer[:live] = self.matrix
+            kept = np.empty(capacity, dtype=np.int64)
+            kept[:live] = self.embedded
+            self.buffer, self.positions = buffer, kept
+            self.start, self.end = 0, live
+        self.buffer[self.end:self.end + len(vectors)] = vectors
+        self.positions[self.end:self.end + len(vectors)] = positions
+        self.end += len(vectors)
+
+    def drop_before(self, min_id: int):
+        """Forget the rows evicted from the table, which are always the oldest"""
+        count = bisect.bisect_left(self.ids, min_id)
+        for offset in range(count):
+            position = self.base + offset
+            for band, key in zip(self.bands, _bands(self.simhashes[offset])):
+                bucket = band[key]
+                bucket.remove(position)
+                if not bucket:
+                    del band[key]
+        del self.ids[:count], self.simhashes[:count]
+        self.base += count
+        self.start += int(np.searchsorted(self.embedded, self.base))
+
+
+class QuestionIndex:
+    """Every generated question, and which users have seen which.
+
+    Each question is fingerprinted twice: a SimHash of its normalized
+    wording, looked up through LSH bands, catches rewordings, and the
+    cosine similarity of its embedding against an in-memory matrix of the
+    pool catches paraphrases. A question matching one the user has seen,
+    or another question of the same quiz, is a repeat. Near-duplicates
+    share one row, so the pool holds distinct questions only. The
+    in-memory index loads only the rows added since it last looked, from
+    this or any other process, and drops the ones evicted.
+    """
+
+    def __init__(
+        self,
+        embeddings,
+        path: str = QUESTION_INDEX_PATH,
+        threshold: float = SIMILARITY_THRESHOLD,
+        max_distance: int = MAX_DISTANCE,
+        max_questions: int = MAX_QUESTIONS,
+    ):
+        self.embeddings = embeddings
+        self.path = path
+        self.threshold = threshold
+        self.max_distance = max_distance
+        self.max_questions = max_questions
+        self._lock = threading.Lock()
+        self._loaded = _Index()
+        create_tables(path, SCHEMA)
+
+    def fingerprint(self, texts: list[str]) -> list[Fingerprint]:
+        """SimHash and embedding of each question text, embedded in one batch"""
+        try:
+            vectors = [normalize(vector) for vector in self.embeddings.embed_documents(texts)]
+        except Exception:
+            # Wording alone still catches most repeats.
+            metrics.increment("question_index.error")
+            vectors = [None] * len(texts)
+        return [Fingerprint(simhash(text), vector) for text, vector in zip(texts, vectors)]
+
+    def _index(self, conn) -> _Index:
+        """The in-memory index brought up to date; the caller holds self._lock"""
+        # Rows are only appended and evicted oldest first, so the id range
+        # tells what changed; unlike COUNT(*) it is read off the index.
+        min_id, max_id = conn.execute(
+            "SELECT (SELECT MIN(id) FROM questions), (SELECT MAX(id) FROM questions)"
+        ).fetchone()
+        index = self._loaded
+        if index.max_id is not None and (max_id is None or max_id < index.max_id):
+            # The table was cleared or replaced.
+            index = self._loaded = _Index()
+        if max_id is not None and max_id != index.max_id:
+            index.add(conn.execute(
+                "SELECT id, simhash, embedding FROM questions WHERE id > ? ORDER BY id",
+                (index.max_id if index.max_id is not None else -1,),
+            ))
+        if min_id is not None:
+            index.drop_before(min_id)
+        return index
+
+    def _all_matches(self, index: _Index, fingerprints: list[Fingerprint]) -> list[list[int]]:
+        """Ids of pooled questions near each fingerprint, closest wording first"""
+        embedded = [
+            i for i, fingerprint in enumerate(fingerprints)
+            if fingerprint.vector is not None and len(index.embedded)
+            and index.matrix.shape[1] == fingerprint.vector.shape[0]
+        ]
+        similarities = {}
+        if embedded:
+            # One pass over the matrix for the whole batch.
+            product = index.matrix @ np.stack([fingerprints[i].vector for i in embedded]).T
+            similarities = {i: product[:, column] for column, i in enumerate(embedded)}
+        return [
+            self._matches(index, fingerprint, similarities.get(i)) for i, fingerprint in enumerate(fingerprints)
+        ]
+
+    def _matches(self, index: _Index, fingerprint: Fingerprint, similarities) -> list[int]:
+        candidates = set()
+        for band, key in zip(index.bands, _bands(fingerprint.simhash)):
+            candidates.update(band.get(key, ()))
+        close = []
+        for position in candidates:
+            distance = (index.simhashes[position - index.base] ^ fingerprint.simhash).bit_count()
+            if distance <= self.max_distance:
+                close.append((distance, index.ids[position - index.base]))
+        matches = [row_id for _distance, row_id in sorted(close)]
+        if similarities is not None:
+            rows = np.flatnonzero(similarities >= self.threshold)
+            for row in rows[np.argsort(-similarities[rows])]:
+                row_id = index.ids[index.embedded[row] - index.base]
+                if row_id not in matches:
+                    matches.append(row_id)
+        return matches
+
+    def _same(self, a: Fingerprint, b: Fingerprint) -> bool:
+        if (a.simhash ^ b.simhash).bit_count() <= self.max_distance:
+            return True
+        return (
+            a.vector is not None and b.vector is not None and a.vector.shape == b.vector.shape
+            and float(a.vector @ b.vector) >= self.threshold
+        )
+
+    def repeats(self, user_id: Optional[str], questions: list[dict], accepted: list[dict] = ()) -> list[bool]:
+        """For each question, whether it repeats one the user has seen or an earlier one here.
+
+        `accepted` are questions already kept for the same quiz. Without a
+        `user_id` only the quiz's own questions count.
+        """
+        start = time.perf_counter()
+        texts = [question["question"] for question in accepted] + [question["question"] for question in questions]
+        fingerprints = self.fingerprint(texts)
+        kept = fingerprints[:len(accepted)]
+        matched = [[] for _question in questions]
+        seen = set()
+        if user_id is not None:
+            with closing(connect(self.path)) as conn:
+                with self._lock:
+                    matched = self._all_matches(self._index(conn), fingerprints[len(accepted):])
+                candidate_ids = sorted({row_id for ids in matched for row_id in ids})
+                if candidate_ids:
+                    seen = {
+                        row_id for (row_id,) in conn.execute(
+                            f"SELECT question_id FROM seen WHERE user_id = ? AND question_id IN "
+                            f"({', '.join('?' * len(candidate_ids))})",
+                            [user_id, *candidate_ids],
+                        )
+                    }
+        repeats = []
+        for fingerprint, ids in zip(fingerprints[len(accepted):], matched):
+            repeat = any(row_id in seen for row_id in ids) or any(self._same(fingerprint, other) for other in kept)
+            repeats.append(repeat)
+            if not repeat:
+                kept.append(fingerprint)
+        metrics.observe("question_index.check_seconds", time.perf_counter() - start)
+        metrics.increment("question_index.repeat", sum(repeats))
+        return repeats
+
+    def mark_seen(self, user_id: str, questions: list[dict]):
+        """Add the questions to the pool, merging near-duplicates, and record the user saw them"""
+        if not questions:
+            return
+        fingerprints = self.fingerprint([question["question"] for question in questions])
+        now = time.time()
+        with closing(connect(self.path)) as conn, self._lock:
+            conn.execute("BEGIN IMMEDIATE")
+            # Read inside the write lock, so questions another process just added are merged with.
+            matched = self._all_matches(self._index(conn), fingerprints)
+            for question, fingerprint, matches in zip(questions, fingerprints, matched):
+                if matches:
+                    question_id = matches[0]
+                else:
+                    question_id = conn.execute(
+                        "INSERT INTO questions (text, simhash, embedding, created_at) VALUES (?, ?, ?, ?)",
+                        (
+                            question["question"],
+                            _to_sql(fingerprint.simhash),
+                            fingerprint.vector.tobytes() if fingerprint.vector is not None else None,
+                            now,
+                        ),
+                    ).lastrowid
+                conn.execute(
+                    "INSERT OR REPLACE INTO seen (user_id, question_id, seen_at) VALUES (?, ?, ?)",
+                    (user_id, question_id, now),
+                )
+            self._evict(conn)
+            conn.execute("COMMIT")
+
+    def _evict(self, conn):
+        # Ids are handed out in order, so everything at or below the cutoff
+        # is the oldest; reading it off MAX(id) avoids counting the table.
+        (max_id,) = conn.execute("SELECT MAX(id) FROM questions").fetchone()
+        if max_id is None:
+            return
+        cutoff = max_id - self.max_questions
+        overflow = conn.execute("DELETE FROM questions WHERE id <= ?", (cutoff,)).rowcount
+        if overflow:
+            conn.execute("DELETE FROM seen WHERE question_id <= ?", (cutoff,))
+            metrics.increment("question_index.evicted", overflow)
+
+    def __len__(self):
+        with closing(connect(self.path)) as conn:
+            return conn.execute("SELECT COUNT(*) FROM questions").fetchone()[0]
@@ -0,0 +1,52 @@
+from contextlib import closing
+from langchain_community.llms.ollama import Ollama
+from llm_cache import CachedLLM, PromptCache, llm_cache_enabled
+from prompt_builder import CONTEXT_WINDOW, build_quiz_prompt
+from quiz_parser import QuizStreamParser, parse_questions
+
+
+MODEL_NAME = "llama3.2:latest"
+
+
+def create_model():
+    llm = Ollama(model=MODEL_NAME, num_ctx=CONTEXT_WINDOW)
+    return CachedLLM(llm, PromptCache() if llm_cache_enabled() else None)
+
+
+def stream_questions(model, prompt_text: str, quiz_type: str, cache: bool = False, stop=None):
+    """Yield each question as soon as the streamed response completes it.
+
+    Quizzes bypass the prompt cache unless `cache` is set, so asking
+    again for the same topics gives new questions. Setting the `stop`
+    event ends the model stream early.
+    """
+    parser = QuizStreamParser(quiz_type)
+    with closing(model.stream(prompt_text, cache=cache)) as chunks:
+        for chunk in chunks:
+            if stop is not None and stop.is_set():
+                return
+            yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+def regenerate_question(model, quiz_type, topics, difficulty, results, avoid, attempts=2):
+    """Ask the model for one replacement question; None if every attempt fails"""
+    for _attempt in range(attempts):
+        prompt = build_quiz_prompt(quiz_type, topics, 1, difficulty, results, avoid=avoid)
+        for question in parse_questions(model.invoke(prompt.text, cache=False), quiz_type):
+            if not question["malformed"]:
+                return question
+    return None
+
+
+def repair_questions(model, questions, quiz_type, topics, difficulty, results):
+    """Regenerate malformed questions one at a time, dropping any that stay broken"""
+    repaired = []
+    for question in questions:
+        if question["malformed"]:
+            avoid = [q["question"] for q in questions + repaired if not q["malformed"]]
+            question = regenerate_question(model, quiz_type, topics, difficulty, results, avoid)
+            if question is None:
+                continue
+        repaired.append(question)
+    return repaired
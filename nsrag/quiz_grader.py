@@ -0,0 +1,33 @@
+from quiz_parser import public_question
+
+
+def split_answer_key(questions: list[dict]):
+    """Separate what the user may see from the answers kept server-side"""
+    public = [public_question(question) for question in questions]
+    answer_key = [
+        {"answer": question["answer"], "explanation": question.get("explanation", "")}
+        for question in questions
+    ]
+    return public, answer_key
+
+
+def grade_quiz(answer_key: list[dict], user_answers: dict) -> dict:
+    """Compare the user's answers with the stored key; no model call needed"""
+    answers = {int(idx): answer for idx, answer in user_answers.items()}
+    results = []
+    for idx, key in enumerate(answer_key):
+        user_answer = answers.get(idx)
+        results.append({
+            "user_answer": user_answer,
+            "correct_answer": key["answer"],
+            "explanation": key["explanation"],
+            "is_correct": user_answer is not None and user_answer == key["answer"],
+        })
+    correct = sum(result["is_correct"] for result in results)
+    total = len(answer_key)
+    return {
+        "correct": correct,
+        "total": total,
+        "percentage": (correct / total * 100) if total > 0 else 0,
+        "results": results,
+    }
@@ -0,0 +1,217 @@
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from langchain_core.documents import Document
+from engine import QuizCancelled
+from quiz_parser import public_question
+from sqlite_store import CACHE_DIR, connect, create_tables
+
+
+QUIZ_JOBS_PATH = os.path.join(CACHE_DIR, "quiz_jobs.sqlite3")
+JOB_WORKERS = int(os.environ.get("QUIZ_JOB_WORKERS", 4))
+# Finished jobs are forgotten, oldest first, beyond this many.
+MAX_JOBS = int(os.environ.get("QUIZ_JOB_HISTORY", 500))
+# A running job whose process has not reported for this long is taken to have died.
+STALE_AFTER = float(os.environ.get("QUIZ_JOB_STALE_AFTER", 600))
+# Seconds between the reports of a running job, also while it waits for the model.
+HEARTBEAT_INTERVAL = STALE_AFTER / 4
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    num_questions INTEGER NOT NULL,
+    questions TEXT NOT NULL,
+    quiz TEXT,
+    quiz_id TEXT,
+    error TEXT,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_created_at ON jobs (created_at);
+"""
+
+
+def _dump_quiz(quiz: dict) -> str:
+    # Context chunks are Documents; keep what the feedback prompt needs.
+    return json.dumps(dict(quiz, context_results=[
+        [doc.page_content, doc.metadata, score] for doc, score in quiz.get("context_results", [])
+    ]))
+
+
+def _load_quiz(payload: str) -> dict:
+    quiz = json.loads(payload)
+    quiz["context_results"] = [
+        (Document(page_content=text, metadata=metadata), score)
+        for text, metadata, score in quiz["context_results"]
+    ]
+    return quiz
+
+
+class QuizJobs:
+    """Quiz generation as background jobs that clients poll.
+
+    submit() returns a job id at once; a worker pool in this process runs
+    the engine. Job state, including the questions completed so far
+    (shown without their answers), is kept in SQLite, so any process on
+    the host, e.g. another API worker, can report or cancel a job. With a
+    `store`, a finished quiz's answer key is saved there for grading and
+    its quiz_id reported.
+    """
+
+    def __init__(
+        self,
+        engine,
+        store=None,
+        workers: int = JOB_WORKERS,
+        max_jobs: int = MAX_JOBS,
+        path: str = QUIZ_JOBS_PATH,
+    ):
+        self.engine = engine
+        self.store = store
+        self.max_jobs = max_jobs
+        self.path = path
+        create_tables(path, SCHEMA)
+        # Stop events of the jobs this process runs
+        self._stops = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="quiz-job")
+
+    def submit(self, user_id, topics, quiz_type, difficulty, num_questions) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with closing(connect(self.path)) as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, status, num_questions, questions, created_at, updated_at) "
+                "VALUES (?, ?, ?, '[]', ?, ?)",
+                (job_id, QUEUED, num_questions, now, now),
+            )
+            self._forget_old(conn)
+        stop = threading.Event()
+        with self._lock:
+            self._stops[job_id] = stop
+        params = {
+            "user_id": user_id,
+            "topics": topics,
+            "quiz_type": quiz_type,
+            "difficulty": difficulty,
+            "num_questions": num_questions,
+        }
+        self._executor.submit(self._run, job_id, params, stop)
+        return job_id
+
+    def _forget_old(self, conn):
+        conn.execute(
+            f"DELETE FROM jobs WHERE job_id IN (SELECT job_id FROM jobs WHERE status IN "
+            f"({', '.join('?' * len(FINISHED))}) ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+            (*FINISHED, self.max_jobs),
+        )
+
+    def _update(self, job_id: str, stop: threading.Event, **changes):
+        """Save the job's progress; picks up a cancel requested from any process"""
+        changes["updated_at"] = time.time()
+        columns = ", ".join(f"{name} = ?" for name in changes)
+        with closing(connect(self.path)) as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE job_id = ?", (*changes.values(), job_id))
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None or row[0]:
+            stop.set()
+
+    def _heartbeat(self, job_id, stop, finished):
+        while not finished.wait(HEARTBEAT_INTERVAL):
+            self._update(job_id, stop)
+
+    def _run(self, job_id, params, stop):
+        finished = threading.Event()
+        try:
+            self._update(job_id, stop, status=RUNNING)
+            threading.Thread(
+                target=self._heartbeat, args=(job_id, stop, finished), daemon=True, name="quiz-job-heartbeat"
+            ).start()
+            if stop.is_set():
+                self._update(job_id, stop, status=CANCELLED)
+                return
+            quiz = self.engine.get_quiz(
+                params["user_id"],
+                params["topics"],
+                params["quiz_type"],
+                params["difficulty"],
+                params["num_questions"],
+                on_question=lambda ready: self._update(job_id, stop, questions=json.dumps(ready)),
+                stop=stop,
+            )
+            quiz_id = None
+            if self.store is not None and quiz["questions"]:
+                _public, answer_key = self.engine.split_answer_key(quiz["questions"])
+                quiz_id = self.store.put({
+                    "type": quiz["type"],
+                    "topics": quiz["topics"],
+                    "difficulty": quiz["difficulty"],
+                    "answer_key": answer_key,
+                })
+            self._update(
+                job_id, stop, status=DONE, quiz=_dump_quiz(quiz), quiz_id=quiz_id,
+                questions=json.dumps(quiz["questions"]),
+            )
+        except QuizCancelled:
+            self._update(job_id, stop, status=CANCELLED)
+        except Exception as e:
+            self._update(job_id, stop, status=FAILED, error=str(e))
+        finally:
+            finished.set()
+            with self._lock:
+                self._stops.pop(job_id, None)
+
+    def get(self, job_id: str):
+        """The job's current state, or None for an unknown job"""
+        with closing(connect(self.path)) as conn:
+            row = conn.execute(
+                "SELECT status, num_questions, questions, quiz, quiz_id, error, created_at, updated_at "
+                "FROM jobs WHERE job_id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        status, num_questions, questions, quiz, quiz_id, error, created_at, updated_at = row
+        if status == RUNNING and time.time() - updated_at > STALE_AFTER:
+            status, error = FAILED, "The process running this job stopped"
+        return {
+            "job_id": job_id,
+            "status": status,
+            "num_questions": num_questions,
+            "questions": [public_question(question) for question in json.loads(questions)],
+            "quiz": _load_quiz(quiz) if quiz else None,
+            "quiz_id": quiz_id,
+            "error": error,
+            "created_at": created_at,
+            "updated_at": updated_at,
+        }
+
+    def cancel(self, job_id: str) -> bool:
+        """Stop a queued or running job; False if it is unknown or finished"""
+        with closing(connect(self.path)) as conn:
+            changed = conn.execute(
+                f"UPDATE jobs SET cancel_requested = 1 WHERE job_id = ? AND status NOT IN "
+                f"({', '.join('?' * len(FINISHED))})",
+                (job_id, *FINISHED),
+            ).rowcount
+        if not changed:
+            return False
+        # A job run by another process stops at its next progress update.
+        with self._lock:
+            stop = self._stops.get(job_id)
+        if stop is not None:
+            stop.set()
+        return True
@@ -0,0 +1,175 @@
+import re
+
+
+MCQ = "Multiple Choice (MCQ)"
+TRUE_FALSE = "True/False"
+OPTION_LETTERS = ["A", "B", "C", "D"]
+
+# "Question 1: ...", "**Question 1.**", "### Q1) ...", "1. ...", "1) ..."
+QUESTION_PATTERN = re.compile(
+    r"^[#>*_\s]*(?:question\s*|q\s*)?(\d{1,2})\s*(?:[:.)\-]|$)\s*(?:[*_]+\s*)?(.*)$",
+    re.IGNORECASE,
+)
+# "A) ...", "a. ...", "(A) ...", "A: ...", "- **B)** ..."
+OPTION_PATTERN = re.compile(r"^[-*_\s]*\(?([A-Da-d])\s*[).:\]]\s*(?:[*_]+\s*)?(.+)$")
+# "Answer: B", "**Correct Answer:** (b)", "Answer - True"
+ANSWER_PATTERN = re.compile(
+    r"^[-*_\s]*(?:correct\s+)?answer\s*[*_]*\s*[:\-]\s*[*_\[(\s]*(true|false|[A-Da-dTF])\b",
+    re.IGNORECASE,
+)
+EXPLANATION_PATTERN = re.compile(r"^[-*_\s]*explanation\s*[*_]*\s*[:\-]\s*[*_]*\s*(.*)$", re.IGNORECASE)
+# Trailing markdown and "(True/False)" style hints
+QUESTION_SUFFIX = re.compile(r"\s*(?:[*_]+|\((?:true\s*/\s*false|t\s*/\s*f)\))\s*$", re.IGNORECASE)
+
+
+def _clean(text: str) -> str:
+    text = text.strip()
+    while True:
+        stripped = QUESTION_SUFFIX.sub("", text)
+        if stripped == text:
+            return text.strip("*_ ").strip()
+        text = stripped
+
+
+def normalize_answer(answer: str, quiz_type: str):
+    """Map 'b', 'T', 'true' etc. to the option keys used by parsed questions"""
+    answer = answer.strip().lower()
+    if quiz_type == TRUE_FALSE:
+        if answer in ("t", "true"):
+            return "True"
+        if answer in ("f", "false"):
+            return "False"
+        return None
+    answer = answer.upper()
+    return answer if answer in OPTION_LETTERS else None
+
+
+def check_question(question: dict, quiz_type: str):
+    """Return why a parsed question is unusable, or None if it is fine"""
+    if not question["question"]:
+        return "missing question text"
+    if quiz_type == MCQ:
+        letters = [letter for letter, _text in question["options"]]
+        if letters != OPTION_LETTERS:
+            return f"expected options A-D, got {''.join(letters) or 'none'}"
+    if question["answer"] is None:
+        return "missing or invalid answer"
+    return None
+
+
+def public_question(question: dict) -> dict:
+    """The question without its answer and explanation, safe to show before grading"""
+    return {"question": question["question"], "options": question["options"]}
+
+
+class QuizStreamParser:
+    """Parse MCQ or True/False questions from a response as it streams in.
+
+    feed() takes arbitrary chunks of text and returns the questions that
+    were completed by them; close() flushes the rest. A question is
+    complete once its explanation line arrives (or the next question
+    starts). Every question is a dict with 'number', 'question',
+    'options', 'answer', 'explanation' and 'malformed' (None or the reason
+    it cannot be used).
+    """
+
+    def __init__(self, quiz_type: str):
+        self.quiz_type = quiz_type
+        self.buffer = ""
+        self.current = None
+        self.questions = []
+
+    def feed(self, chunk: str) -> list[dict]:
+        self.buffer += chunk
+        *lines, self.buffer = self.buffer.split("\n")
+        completed = []
+        for line in lines:
+            completed.extend(self._process_line(line))
+        return completed
+
+    def close(self) -> list[dict]:
+        completed = []
+        if self.buffer:
+            completed.extend(self._process_line(self.buffer))
+            self.buffer = ""
+        completed.extend(self._finish())
+        return completed
+
+    def _start(self, number: int, text: str) -> list[dict]:
+        completed = self._finish()
+        self.current = {
+            "number": number,
+            "question": _clean(text),
+            "options": [],
+            "answer": None,
+            "explanation": "",
+        }
+        return completed
+
+    def _finish(self) -> list[dict]:
+        question, self.current = self.current, None
+        if question is None:
+            return []
+        if self.quiz_type == TRUE_FALSE:
+            question["options"] = [("True", "True"), ("False", "False")]
+        question["malformed"] = check_question(question, self.quiz_type)
+        self.questions.append(question)
+        return [question]
+
+    def _process_line(self, line: str) -> list[dict]:
+        line = line.strip()
+        if not line:
+            return []
+
+        if self.current is not None:
+            answer = ANSWER_PATTERN.match(line)
+            if answer:
+                self.current["answer"] = normalize_answer(answer.group(1), self.quiz_type)
+                return []
+            explanation = EXPLANATION_PATTERN.match(line)
+            if explanation:
+                self.current["explanation"] = explanation.group(1).strip()
+                return self._finish()
+
+        option = OPTION_PATTERN.match(line)
+        if option and self.current is not None and self.quiz_type == MCQ:
+            letter = option.group(1).upper()
+            self.current["options"].append((letter, _clean(option.group(2))))
+            return []
+
+        question = QUESTION_PATTERN.match(line)
+        if question:
+            return self._start(int(question.group(1)), question.group(2))
+
+        if self.current is not None and not self.current["options"] and self.current["answer"] is None:
+            # Question text continued on the line after its label.
+            self.current["question"] = _clean(f"{self.current['question']} {line}")
+        return []
+
+
+def parse_questions(text: str, quiz_type: str) -> list[dict]:
+    """Parse a complete response"""
+    parser = QuizStreamParser(quiz_type)
+    return parser.feed(text) + parser.close()
+
+
+def format_questions(questions: list[dict]) -> str:
+    """Render questions back into the prompt format, without answers"""
+    blocks = []
+    for number, question in enumerate(questions, 1):
+        lines = [f"Question {number}: {question['question']}"]
+        if len(question["options"]) == len(OPTION_LETTERS):
+            lines += [f"{letter}) {text}" for letter, text in question["options"]]
+        blocks.append("\n".join(lines))
+    return "\n\n".join(blocks)
+
+
+def format_answer_key(answer_key: list[dict]) -> str:
+    """Each correct answer and its explanation, numbered as format_questions() does"""
+    lines = []
+    for number, key in enumerate(answer_key, 1):
+        line = f"{number}. {key['answer']}"
+        if key.get("explanation"):
+            line = f"{line} - {key['explanation']}"
+        lines.append(line)
+    return "\n".join(lines)
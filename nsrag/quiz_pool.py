@@ -0,0 +1,235 @@
+import argparse
+import json
+import os
+import threading
+import time
+from contextlib import closing
+from itertools import product
+from typing import Optional
+from llm_scheduler import PRIORITY_BACKGROUND, get_scheduler
+from quiz_parser import MCQ, TRUE_FALSE
+from topics import TOPICS
+from sqlite_store import CACHE_DIR, connect, create_tables
+
+
+POOL_PATH = os.path.join(CACHE_DIR, "quiz_pool.sqlite3")
+QUIZ_TYPES = [MCQ, TRUE_FALSE]
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+TARGET_DEPTH = 3
+# Questions per pooled quiz; served quizzes are cut to the requested size.
+POOL_QUIZ_SIZE = 10
+# A pooled quiz is retired once this many users have been served it.
+MAX_SERVES = 20
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS quizzes (
+    id INTEGER PRIMARY KEY,
+    topic TEXT NOT NULL,
+    quiz_type TEXT NOT NULL,
+    difficulty TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    serves INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS quizzes_by_pool ON quizzes (topic, quiz_type, difficulty);
+CREATE TABLE IF NOT EXISTS served (
+    user_id TEXT NOT NULL,
+    quiz_id INTEGER NOT NULL,
+    served_at REAL NOT NULL,
+    PRIMARY KEY (user_id, quiz_id)
+);
+"""
+
+
+def all_pools():
+    return list(product(TOPICS, QUIZ_TYPES, DIFFICULTIES))
+
+
+def _split(total: int, parts: int) -> list[int]:
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+class QuizPool:
+    """Ready-made quizzes, one pool per topic, type and difficulty.
+
+    Stored questions carry their answer and explanation.
+    """
+
+    def __init__(self, path: str = POOL_PATH):
+        self.path = path
+        create_tables(path, SCHEMA)
+
+    def depths(self) -> dict:
+        with closing(connect(self.path)) as conn:
+            rows = conn.execute(
+                "SELECT topic, quiz_type, difficulty, COUNT(*) FROM quizzes "
+                "GROUP BY topic, quiz_type, difficulty"
+            ).fetchall()
+        return {(topic, quiz_type, difficulty): n for topic, quiz_type, difficulty, n in rows}
+
+    def add(self, quiz: dict):
+        payload = {key: quiz[key] for key in ("type", "topics", "difficulty", "questions", "sources")}
+        with closing(connect(self.path)) as conn:
+            conn.execute(
+                "INSERT INTO quizzes (topic, quiz_type, difficulty, payload, created_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (quiz["topics"][0], quiz["type"], quiz["difficulty"], json.dumps(payload), time.time()),
+            )
+
+    def take(
+        self, user_id: Optional[str], topics: list[str], quiz_type: str, difficulty: str, num_questions: int
+    ):
+        """Serve a quiz the user has not seen, or None if any topic's pool is empty.
+
+        With several topics, the questions are split between one pooled
+        quiz per topic. Without a user_id any quiz may be served, and
+        nothing is recorded as seen.
+        """
+        with closing(connect(self.path)) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            picks = []
+            for topic in topics:
+                row = conn.execute(
+                    "SELECT id, payload FROM quizzes "
+                    "WHERE topic = ? AND quiz_type = ? AND difficulty = ? "
+                    "AND id NOT IN (SELECT quiz_id FROM served WHERE user_id = ?) "
+                    "ORDER BY serves, RANDOM() LIMIT 1",
+                    (topic, quiz_type, difficulty, user_id),
+                ).fetchone()
+                if row is None:
+                    conn.execute("ROLLBACK")
+                    return None
+                picks.append(row)
+
+            now = time.time()
+            for quiz_id, _payload in picks:
+                if user_id is not None:
+                    conn.execute(
+                        "INSERT OR IGNORE INTO served (user_id, quiz_id, served_at) VALUES (?, ?, ?)",
+                        (user_id, quiz_id, now),
+                    )
+                conn.execute("UPDATE quizzes SET serves = serves + 1 WHERE id = ?", (quiz_id,))
+            retired = [
+                quiz_id
+                for (quiz_id,) in conn.execute(
+                    "SELECT id FROM quizzes WHERE serves >= ?", (MAX_SERVES,)
+                )
+            ]
+            for quiz_id in retired:
+                conn.execute("DELETE FROM quizzes WHERE id = ?", (quiz_id,))
+                conn.execute("DELETE FROM served WHERE quiz_id = ?", (quiz_id,))
+            conn.execute("COMMIT")
+
+        questions = []
+        sources = []
+        for (quiz_id, payload), share in zip(picks, _split(num_questions, len(picks))):
+            quiz = json.loads(payload)
+            questions.extend(quiz["questions"][:share])
+            sources.extend(quiz.get("sources", []))
+        return {
+            "type": quiz_type,
+            "topics": topics,
+            "difficulty": difficulty,
+            "questions": questions,
+            "sources": sources,
+            "quiz_ids": [quiz_id for quiz_id, _payload in picks],
+        }
+
+
+class PoolRefiller(threading.Thread):
+    """Background worker that keeps every pool at or above the target depth.
+
+    It has the engine generate one quiz at a time for the emptiest pool
+    and then waits `interval` seconds, so interactive requests still get
+    the model.
+    """
+
+    _in_progress = set()
+    _in_progress_lock = threading.Lock()
+
+    def __init__(self, engine, target_depth: int = TARGET_DEPTH, interval: float = 30.0, pools=None):
+        super().__init__(daemon=True, name="quiz-pool-refill")
+        self.engine = engine
+        self.pool = engine.pool
+        self.target_depth = target_depth
+        self.interval = interval
+        self.pools = pools or all_pools()
+        self.stop_event = threading.Event()
+
+    def stop(self):
+        self.stop_event.set()
+
+    def _claim_next(self):
+        depths = self.pool.depths()
+        with self._in_progress_lock:
+            candidates = [
+                key
+                for key in self.pools
+                if depths.get(key, 0) < self.target_depth and key not in self._in_progress
+            ]
+            if not candidates:
+                return None
+            key = min(candidates, key=lambda key: depths.get(key, 0))
+            self._in_progress.add(key)
+            return key
+
+    def refill_one(self, model, key):
+        topic, quiz_type, difficulty = key
+        quiz = self.engine.generate_quiz([topic], quiz_type, difficulty, POOL_QUIZ_SIZE, model=model)
+        if quiz["questions"]:
+            self.pool.add(quiz)
+
+    def run(self):
+        # Shares the process's model queue, behind any interactive request.
+        model = get_scheduler().client(PRIORITY_BACKGROUND)
+        while not self.stop_event.is_set():
+            key = self._claim_next()
+            if key is None:
+                self.stop_event.wait(self.interval)
+                continue
+            try:
+                self.refill_one(model, key)
+            except Exception as e:
+                print(f"⚠️  Pool refill failed for {key}: {e}")
+            finally:
+                with self._in_progress_lock:
+                    self._in_progress.discard(key)
+            self.stop_event.wait(self.interval)
+
+
+def start_refillers(engine, workers: int, target_depth: int = TARGET_DEPTH, interval: float = 30.0):
+    """Refill `engine.pool`, generating quizzes with the engine"""
+    refillers = [PoolRefiller(engine, target_depth, interval) for _ in range(workers)]
+    for refiller in refillers:
+        refiller.start()
+    return refillers
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=1, help="Number of refill workers.")
+    parser.add_argument("--target", type=int, default=TARGET_DEPTH, help="Quizzes to keep in each pool.")
+    parser.add_argument(
+        "--interval", type=float, default=30.0, help="Seconds each worker waits between generations."
+    )
+    args = parser.parse_args()
+
+    # The engine imports this module.
+    from engine import QuizEngine
+
+    engine = QuizEngine()
+    refillers = start_refillers(engine, args.workers, args.target, args.interval)
+    print(f"🔁 Refilling quiz pools with {args.workers} worker(s), Ctrl+C to stop")
+    try:
+        while True:
+            time.sleep(60)
+            depths = engine.pool.depths()
+            full = sum(1 for key in all_pools() if depths.get(key, 0) >= args.target)
+            print(f"📦 {full}/{len(all_pools())} pools at target depth")
+    except KeyboardInterrupt:
+        for refiller in refillers:
+            refiller.stop()
+
+
+if __name__ == "__main__":
+    main()
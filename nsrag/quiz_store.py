@@ -0,0 +1,52 @@
+import json
+import os
+import time
+import uuid
+from contextlib import closing
+from sqlite_store import CACHE_DIR, connect, create_tables
+
+
+QUIZ_STORE_PATH = os.path.join(CACHE_DIR, "issued_quizzes.sqlite3")
+# Quizzes not graded within this many seconds are forgotten.
+QUIZ_STORE_TTL = float(os.environ.get("QUIZ_STORE_TTL", 24 * 3600))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS issued (
+    quiz_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS issued_by_created_at ON issued (created_at);
+"""
+
+
+class QuizStore:
+    """Quizzes handed to API clients, kept server-side until they are graded.
+
+    Lives in SQLite rather than in memory so that any API worker on the
+    host can grade a quiz another worker issued.
+    """
+
+    def __init__(self, path: str = QUIZ_STORE_PATH, ttl: float = QUIZ_STORE_TTL):
+        self.path = path
+        self.ttl = ttl
+        create_tables(path, SCHEMA)
+
+    def put(self, quiz: dict) -> str:
+        quiz_id = uuid.uuid4().hex
+        now = time.time()
+        with closing(connect(self.path)) as conn:
+            conn.execute("DELETE FROM issued WHERE created_at < ?", (now - self.ttl,))
+            conn.execute(
+                "INSERT INTO issued (quiz_id, payload, created_at) VALUES (?, ?, ?)",
+                (quiz_id, json.dumps(quiz), now),
+            )
+        return quiz_id
+
+    def get(self, quiz_id: str):
+        with closing(connect(self.path)) as conn:
+            row = conn.execute(
+                "SELECT payload FROM issued WHERE quiz_id = ? AND created_at >= ?",
+                (quiz_id, time.time() - self.ttl),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
@@ -0,0 +1,144 @@
+import os
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from langchain_core.documents import Document
+from langchain_community.vectorstores.chroma import Chroma
+from get_embedding_function import get_embedding_function
+from keyword_index import BM25Index, index_path
+
+
+# Anchored to this file so the store is found whether we are run from the
+# repo root (Streamlit) or from nsrag/ (populate_database.py).
+CHROMA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "chroma")
+KEYWORD_INDEX_PATH = index_path(CHROMA_PATH)
+DEFAULT_K = 5
+RRF_K = 60
+# How long to wait for the embedding round trip before answering from the
+# keyword index alone.
+VECTOR_TIMEOUT = float(os.environ.get("RETRIEVER_VECTOR_TIMEOUT", 5))
+
+_keyword_index = None
+_keyword_lock = threading.Lock()
+_vector_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="vector")
+
+
+def check_vector_scale(store) -> bool:
+    """Warn when stored vectors and new embeddings differ in length.
+
+    Unit-length queries against unnormalized stored vectors (or the
+    reverse) rank chunks mostly by stored vector length under L2, so the
+    store has to be rebuilt after switching OLLAMA_EMBED_ENDPOINT.
+    """
+    try:
+        stored = store.get(limit=1, include=["embeddings"])["embeddings"]
+        if stored is None or len(stored) == 0:
+            return True
+        stored_norm = float(np.linalg.norm(stored[0]))
+        new_norm = float(np.linalg.norm(store.embeddings.embed_documents(["scale check"])[0]))
+    except Exception:
+        return True
+    if abs(stored_norm - 1) < 0.05 or abs(new_norm - 1) < 0.05:
+        if abs(stored_norm - new_norm) > 0.25 * max(stored_norm, new_norm):
+            print(
+                f"⚠️  Stored vectors have length {stored_norm:.1f} but new embeddings {new_norm:.1f}: "
+                "rebuild the store with `python populate_database.py --reset`"
+            )
+            return False
+    return True
+
+
+@lru_cache(maxsize=1)
+def _open_store():
+    return Chroma(
+        persist_directory=CHROMA_PATH, embedding_function=get_embedding_function()
+    )
+
+
+@lru_cache(maxsize=1)
+def get_vector_store():
+    """Open the persisted Chroma collection once per process"""
+    store = _open_store()
+    check_vector_scale(store)
+    return store
+
+
+def get_keyword_index():
+    """The BM25 index, or None before populate_database.py has built it"""
+    global _keyword_index
+    with _keyword_lock:
+        if _keyword_index is None and os.path.exists(KEYWORD_INDEX_PATH):
+            _keyword_index = BM25Index(KEYWORD_INDEX_PATH)
+        return _keyword_index
+
+
+def vector_retrieve(query: str, k: int = DEFAULT_K):
+    db = get_vector_store()
+    return db.similarity_search_with_score(query, k=k)
+
+
+def keyword_retrieve(query: str, k: int = DEFAULT_K):
+    index = get_keyword_index()
+    if index is None:
+        return []
+    hits = index.search(query, k)
+    if not hits:
+        return []
+    # Chunk text is read from Chroma by ID; no embedding call is made.
+    stored = _open_store().get(
+        ids=[chunk_id for chunk_id, _score in hits], include=["documents", "metadatas"]
+    )
+    documents = {
+        chunk_id: Document(page_content=text, metadata=metadata or {})
+        for chunk_id, text, metadata in zip(stored["ids"], stored["documents"], stored["metadatas"])
+    }
+    return [(documents[chunk_id], score) for chunk_id, score in hits if chunk_id in documents]
+
+
+def reciprocal_rank_fusion(rankings, k: int = DEFAULT_K):
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, (doc, _score) in enumerate(ranking):
+            chunk_id = doc.metadata.get("id", doc.page_content)
+            scores[chunk_id] = scores.get(chunk_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+            docs.setdefault(chunk_id, doc)
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [(docs[chunk_id], scores[chunk_id]) for chunk_id in best]
+
+
+def retrieve(query: str, k: int = DEFAULT_K):
+    """Return the k best (Document, score) pairs for a query.
+
+    Keyword (BM25) and vector rankings are fused with reciprocal rank
+    fusion. If the embedding model fails or is slower than VECTOR_TIMEOUT,
+    the keyword ranking is used on its own.
+    """
+    candidates = k * 2
+    vector_future = _vector_executor.submit(vector_retrieve, query, candidates)
+    keyword_hits = keyword_retrieve(query, candidates)
+    rankings = [keyword_hits] if keyword_hits else []
+    try:
+        rankings.append(vector_future.result(timeout=VECTOR_TIMEOUT if keyword_hits else None))
+    except Exception:
+        # Includes the TimeoutError from result().
+        if not keyword_hits:
+            raise
+    return reciprocal_rank_fusion(rankings, k)
+
+
+def retrieve_for_topics(topics: list[str], k: int = DEFAULT_K):
+    """Split k across the topics and merge the results without duplicates"""
+    per_topic = max(1, k // max(1, len(topics)))
+    results = []
+    seen_ids = set()
+    for topic in topics:
+        for doc, score in retrieve(topic, k=per_topic):
+            chunk_id = doc.metadata.get("id", doc.page_content)
+            if chunk_id in seen_ids:
+                continue
+            seen_ids.add(chunk_id)
+            results.append((doc, score))
+    return results
+
@@ -0,0 +1,29 @@
+import os
+import sqlite3
+from contextlib import closing
+import numpy as np
+
+
+NSRAG_DIR = os.path.dirname(os.path.abspath(__file__))
+CACHE_DIR = os.path.join(NSRAG_DIR, "cache")
+
+
+def connect(path: str) -> sqlite3.Connection:
+    """Autocommit connection; multi-statement updates open their own transaction"""
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def create_tables(path: str, schema: str):
+    """Create the database file and its directory if missing, then apply `schema`"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with closing(connect(path)) as conn:
+        conn.executescript(schema)
+
+
+def normalize(vector) -> np.ndarray:
+    """Scale an embedding to unit length, so a dot product is its cosine similarity"""
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
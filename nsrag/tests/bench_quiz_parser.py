@@ -0,0 +1,58 @@
+"""Time the quiz parser on the recorded model outputs.
+
+Run from nsrag/: python tests/bench_quiz_parser.py [--repeat N] [--chunk-size N]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from quiz_parser import MCQ, TRUE_FALSE, QuizStreamParser, parse_questions  # noqa: E402
+
+RECORDED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recorded")
+
+
+def stream_parse(text: str, quiz_type: str, chunk_size: int) -> tuple[list[dict], int]:
+    """Questions from `text` fed in chunks, and the characters read before the first came out"""
+    parser = QuizStreamParser(quiz_type)
+    questions, first = [], None
+    for start in range(0, len(text), chunk_size):
+        questions += parser.feed(text[start:start + chunk_size])
+        if questions and first is None:
+            first = start + chunk_size
+    questions += parser.close()
+    return questions, first if first is not None else len(text)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=2000, help="Parses of each output.")
+    parser.add_argument("--chunk-size", type=int, default=4, help="Characters per streamed chunk, about a token.")
+    args = parser.parse_args()
+
+    print(f"{'output':<22}{'questions':>10}{'whole µs':>10}{'stream µs':>11}{'first at':>10}")
+    for name in sorted(os.listdir(RECORDED_DIR)):
+        with open(os.path.join(RECORDED_DIR, name), encoding="utf-8") as f:
+            text = f.read()
+        quiz_type = MCQ if name.startswith("mcq") else TRUE_FALSE
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            whole = parse_questions(text, quiz_type)
+        whole_us = (time.perf_counter() - start) / args.repeat * 1e6
+
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            streamed, first = stream_parse(text, quiz_type, args.chunk_size)
+        stream_us = (time.perf_counter() - start) / args.repeat * 1e6
+
+        if streamed != whole:
+            print(f"⚠️ {name}: streamed parse differs from the whole-text parse")
+        # "first at" is the share of the response read when the first question was ready.
+        print(f"{name:<22}{len(whole):>10}{whole_us:>10.1f}{stream_us:>11.1f}{first / len(text):>10.0%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The nsrag modules import each other by bare name, as when run from nsrag/.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,126 @@
+import os
+import random
+import pytest
+from langchain_core.documents import Document
+from engine import QuizEngine
+from quiz_parser import MCQ, TRUE_FALSE, QuizStreamParser, parse_questions
+
+RECORDED_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recorded")
+
+# Model output file: quiz type, then (answer, malformed) of each question
+RECORDED = {
+    "mcq_plain.txt": (MCQ, [("B", None), ("C", None), ("B", None)]),
+    "mcq_markdown.txt": (MCQ, [("B", None), ("C", None), ("B", None)]),
+    "mcq_malformed.txt": (MCQ, [
+        ("B", None),
+        ("B", "expected options A-D, got AB"),
+        (None, "missing or invalid answer"),
+        (None, "missing or invalid answer"),
+    ]),
+    "tf_plain.txt": (TRUE_FALSE, [("False", None), ("True", None), ("True", None), ("False", None)]),
+    "tf_variants.txt": (TRUE_FALSE, [("False", None), ("True", None), (None, "missing or invalid answer")]),
+}
+
+
+def recorded(name: str) -> str:
+    with open(os.path.join(RECORDED_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+def random_chunks(text: str, rng: random.Random) -> list[str]:
+    """`text` cut at random points, from single characters to long runs"""
+    chunks = []
+    while text:
+        size = rng.choice([1, 2, 3, rng.randint(1, 40), rng.randint(1, 400)])
+        chunks.append(text[:size])
+        text = text[size:]
+    return chunks
+
+
+def stream(text: str, chunks: list[str], quiz_type: str) -> list[dict]:
+    parser = QuizStreamParser(quiz_type)
+    questions = []
+    for chunk in chunks:
+        questions += parser.feed(chunk)
+    return questions + parser.close()
+
+
+@pytest.mark.parametrize("name", sorted(RECORDED))
+def test_recorded_output(name):
+    quiz_type, expected = RECORDED[name]
+    questions = parse_questions(recorded(name), quiz_type)
+    assert [(q["answer"], q["malformed"]) for q in questions] == expected
+    assert all(q["question"] and "*" not in q["question"] for q in questions)
+
+
+@pytest.mark.parametrize("name", sorted(RECORDED))
+def test_chunk_splits_do_not_change_the_parse(name):
+    quiz_type, _expected = RECORDED[name]
+    text = recorded(name)
+    whole = parse_questions(text, quiz_type)
+    rng = random.Random(name)
+    for _trial in range(200):
+        assert stream(text, random_chunks(text, rng), quiz_type) == whole
+    # Windows line endings and no trailing newline
+    assert parse_questions(text.replace("\n", "\r\n").rstrip(), quiz_type) == whole
+
+
+def test_questions_are_emitted_as_soon_as_complete():
+    text = recorded("mcq_plain.txt")
+    parser = QuizStreamParser(MCQ)
+    emitted_at = []
+    for position, char in enumerate(text):
+        emitted_at += [position] * len(parser.feed(char))
+    # Each question is out at the newline ending its explanation, before close().
+    lines = text.split("\n")
+    ends = [
+        len("\n".join(lines[:i + 1])) for i, line in enumerate(lines) if line.startswith("Explanation")
+    ]
+    assert emitted_at == ends
+    assert parser.close() == []
+
+
+class RecordedModel:
+    """Replays model outputs in order, recording the prompts"""
+
+    model = "recorded"
+
+    def __init__(self, outputs: list[str]):
+        self.outputs = list(outputs)
+        self.prompts = []
+
+    def invoke(self, prompt: str, cache: bool = True) -> str:
+        self.prompts.append(prompt)
+        return self.outputs.pop(0)
+
+    def stream(self, prompt: str, cache: bool = True):
+        text = self.invoke(prompt, cache)
+        yield from random_chunks(text, random.Random(len(self.prompts)))
+
+
+class NoRepeats:
+    """Question index that takes every question as new"""
+
+    def repeats(self, user_id, questions, accepted):
+        return [False] * len(questions)
+
+
+def test_malformed_questions_are_regenerated_one_at_a_time():
+    _first, second, third = recorded("mcq_plain.txt").split("\n\n")
+    model = RecordedModel([recorded("mcq_malformed.txt"), second, third, "no quiz here", "still none"])
+    results = [(Document(page_content="ECB, CBC and CTR are block cipher modes."), 1.0)]
+    engine = QuizEngine(
+        model, pool=object(), answer_cache=object(), history=object(), question_index=NoRepeats()
+    )
+    engine.topic_context = lambda topics, k=6: results
+    quiz = engine.generate_quiz(["Block ciphers"], MCQ, "Easy", 4)
+    # The whole quiz is asked for once; then one request per malformed
+    # question, two attempts for the last before it is dropped.
+    assert len(model.prompts) == 5
+    assert all("generate 1 multiple-choice questions" in prompt for prompt in model.prompts[1:])
+    assert [q["question"] for q in quiz["questions"]] == [
+        "Which of these is a symmetric cipher?",
+        "In RSA, which key is used to verify a digital signature?",
+        "What does the TLS handshake primarily establish?",
+    ]
+    assert not any(q["malformed"] for q in quiz["questions"])
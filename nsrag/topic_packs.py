@@ -0,0 +1,137 @@
+import argparse
+import json
+import os
+import threading
+from langchain_core.documents import Document
+from keyword_index import BM25Index, index_path
+from topics import TOPICS
+
+
+NSRAG_DIR = os.path.dirname(os.path.abspath(__file__))
+CHROMA_PATH = os.path.join(NSRAG_DIR, "chroma")
+PACK_SIZE = 6
+
+_packs = None
+_packs_mtime = None
+_packs_lock = threading.Lock()
+
+
+def packs_path(chroma_path: str = CHROMA_PATH) -> str:
+    return os.path.join(chroma_path, "topic_packs.json")
+
+
+def version_path(chroma_path: str = CHROMA_PATH) -> str:
+    return os.path.join(chroma_path, "corpus_version.json")
+
+
+def read_corpus_version(chroma_path: str = CHROMA_PATH):
+    try:
+        with open(version_path(chroma_path)) as f:
+            return json.load(f)["version"]
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_corpus_version(version: str, chroma_path: str = CHROMA_PATH):
+    with open(version_path(chroma_path), "w") as f:
+        json.dump({"version": version}, f)
+
+
+def build_topic_packs(version: str, chroma_path: str = CHROMA_PATH, k: int = PACK_SIZE):
+    """Select and store the best context chunks for every topic"""
+    from retriever import retrieve
+
+    packs = {}
+    for topic in TOPICS:
+        packs[topic] = [
+            {
+                "id": doc.metadata.get("id"),
+                "source": doc.metadata.get("source"),
+                "page": doc.metadata.get("page"),
+                "text": doc.page_content,
+                "score": score,
+            }
+            for doc, score in retrieve(topic, k=k)
+        ]
+    path = packs_path(chroma_path)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump({"corpus_version": version, "packs": packs}, f)
+    os.replace(tmp_path, path)
+    return packs
+
+
+def refresh_topic_packs(chroma_path: str = CHROMA_PATH, force: bool = False) -> bool:
+    """Rebuild the packs if the ingested corpus changed since they were built"""
+    index = BM25Index(index_path(chroma_path))
+    if not len(index):
+        return False
+    version = index.fingerprint()
+    if read_corpus_version(chroma_path) != version:
+        write_corpus_version(version, chroma_path)
+    if not force and load_packs(chroma_path).get("corpus_version") == version:
+        return False
+    print(f"📦 Building topic packs for corpus {version}")
+    build_topic_packs(version, chroma_path)
+    return True
+
+
+def load_packs(chroma_path: str = CHROMA_PATH) -> dict:
+    """Load the packs file, re-reading it only when it changes on disk"""
+    global _packs, _packs_mtime
+    path = packs_path(chroma_path)
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return {}
+    with _packs_lock:
+        if mtime != _packs_mtime:
+            with open(path) as f:
+                _packs = json.load(f)
+            _packs_mtime = mtime
+        return _packs
+
+
+def load_topic_results(topics: list[str], k: int = PACK_SIZE):
+    """Precomputed (Document, score) pairs for the topics, or None if stale"""
+    data = load_packs()
+    if not data or data.get("corpus_version") != read_corpus_version():
+        return None
+    packs = data["packs"]
+    if any(topic not in packs for topic in topics):
+        return None
+    per_topic = max(1, k // max(1, len(topics)))
+    results = []
+    seen_ids = set()
+    for topic in topics:
+        for chunk in packs[topic][:per_topic]:
+            if chunk["id"] in seen_ids:
+                continue
+            seen_ids.add(chunk["id"])
+            metadata = {"id": chunk["id"], "source": chunk["source"], "page": chunk["page"]}
+            results.append((Document(page_content=chunk["text"], metadata=metadata), chunk["score"]))
+    return results
+
+
+def topic_results(topics: list[str], k: int = PACK_SIZE):
+    """Context for the topics from the packs, falling back to live retrieval"""
+    results = load_topic_results(topics, k)
+    if results is None:
+        from retriever import retrieve_for_topics
+
+        results = retrieve_for_topics(topics, k=k)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--force", action="store_true", help="Rebuild even if the corpus is unchanged."
+    )
+    args = parser.parse_args()
+    if not refresh_topic_packs(force=args.force):
+        print("✅ Topic packs are up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+# Topics offered by the quiz generator; topic_packs.py precomputes context for each.
+TOPICS = [
+    "OSI architecture", "Symmetric Encryption", "Rijndael", "Entropy",
+    "Pseudorandom Number Generator", "Block and Stream Ciphers", "RC4 Stream Cipher",
+    "Public-Key Cryptography", "RSA", "Homomorphic encryption",
+    "Message authentication", "Hash functions", "Secure Hash Function",
+    "Length Extension Attacks", "Message Authentication Code", "HMAC",
+    "Authenticated Encryption", "TLS 1.0 Lucky 13 Attack", "Digital Signatures",
+    "Hybrid Encryption", "Symmetric key distribution", "Diffie-Hellman Key Exchange"
+]
@@ -2,20 +2,54 @@ import React, { useState } from "react";
 import axios from "axios"; // Import axios
 import "./App.css";
 
+const API_URL = "http://127.0.0.1:5000";
+const POLL_INTERVAL_MS = 1500;
+const USER_ID_KEY = "quizbot_user_id";
+
+// One id per browser, so the API can skip questions this user has seen
+function getUserId() {
+  let userId = localStorage.getItem(USER_ID_KEY);
+  if (!userId) {
+    userId = window.crypto.randomUUID
+      ? window.crypto.randomUUID()
+      : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2)}`;
+    localStorage.setItem(USER_ID_KEY, userId);
+  }
+  return userId;
+}
+
 function App() {
   const [quiz, setQuiz] = useState(null); // State to store quiz data
   const [loading, setLoading] = useState(false); // State for loading spinner
   const [error, setError] = useState(null); // State for error messages
+  const [partial, setPartial] = useState([]); // Questions generated so far
 
-  // Function to fetch quiz from Flask API
+  // Submit a quiz job to the API and poll it until the quiz is ready
   const fetchQuiz = async () => {
     setLoading(true);
     setError(null); // Clear previous errors
+    setQuiz(null);
+    setPartial([]);
     try {
-      const response = await axios.get("http://127.0.0.1:5000/generate_quiz", {
-        timeout: 120000, // Set timeout to 2 minutes (120000 ms)
-      });
-      setQuiz(response.data); // Set the fetched quiz data
+      const submitted = await axios.post(
+        `${API_URL}/quiz_jobs`,
+        { user_id: getUserId() },
+        { timeout: 10000 }
+      );
+      const jobId = submitted.data.job_id;
+      for (;;) {
+        await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+        const response = await axios.get(`${API_URL}/quiz_jobs/${jobId}`, { timeout: 10000 });
+        const job = response.data;
+        setPartial(job.partial || []); // Questions ready so far
+        if (job.status === "done" && !job.error) {
+          setQuiz(job); // Same shape as GET /generate_quiz
+          break;
+        }
+        if (["done", "failed", "cancelled"].includes(job.status)) {
+          throw new Error(job.error || job.status);
+        }
+      }
     } catch (err) {
       setError("Failed to fetch quiz. Please try again."); // Handle errors
     } finally {
@@ -73,10 +107,21 @@ function App() {
                 </ul>
               </div>
             </div>
-          ) : (
-            !loading && (
-              <p>Your quiz will appear here after you click the button.</p>
+          ) : loading ? (
+            partial.length > 0 && (
+              <div>
+                <h2>Generating... ({partial.length} ready)</h2>
+                <ol>
+                  {partial.map((mcq, index) => (
+                    <li key={index}>
+                      <p>{mcq.question_text}</p>
+                    </li>
+                  ))}
+                </ol>
+              </div>
             )
+          ) : (
+            <p>Your quiz will appear here after you click the button.</p>
           )}
         </div>
       </div>
@@ -1,7 +1,8 @@
 #!/usr/bin/env python3
 """
-QuizBot - Simplified Streamlit Interface (No ChromaDB dependency issues)
-Uses direct file reading instead of vector database for maximum compatibility
+QuizBot - Simplified Streamlit Interface
+Retrieves context from the Chroma store built by nsrag/populate_database.py,
+falling back to direct file reading when the store is unavailable
 """
 import streamlit as st
 import sys
@@ -13,11 +14,15 @@ warnings.filterwarnings("ignore")
 # Add nsrag to path
 sys.path.insert(0, str(Path(__file__).parent / "nsrag"))
 
-from langchain_community.llms.ollama import Ollama
-from langchain_core.prompts import ChatPromptTemplate
-import random
+from topics import TOPICS
+from engine import create_engine
+from quiz_jobs import QuizJobs, DONE, FINISHED
+from mastery import weakest_topics
+from quiz_parser import format_questions
+import metrics
+import tempfile
 import time
-import json
+import uuid
 from datetime import datetime
 
 # Page configuration
@@ -209,117 +214,68 @@ if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
 if 'parsed_questions' not in st.session_state:
     st.session_state.parsed_questions = []
-if 'correct_answers' not in st.session_state:
-    st.session_state.correct_answers = {}
-if 'quiz_history' not in st.session_state:
-    st.session_state.quiz_history = []
-if 'total_quizzes' not in st.session_state:
-    st.session_state.total_quizzes = 0
-if 'total_correct' not in st.session_state:
-    st.session_state.total_correct = 0
-if 'total_questions' not in st.session_state:
-    st.session_state.total_questions = 0
+if 'answer_key' not in st.session_state:
+    st.session_state.answer_key = []
 if 'difficulty_level' not in st.session_state:
     st.session_state.difficulty_level = "Medium"
+if 'adaptive' not in st.session_state:
+    st.session_state.adaptive = True
 if 'timer_enabled' not in st.session_state:
     st.session_state.timer_enabled = False
 if 'quiz_start_time' not in st.session_state:
     st.session_state.quiz_start_time = None
-if 'parsed_questions' not in st.session_state:
-    st.session_state.parsed_questions = []
-if 'correct_answers' not in st.session_state:
-    st.session_state.correct_answers = {}
-
-# Initialize model
+if 'feedback' not in st.session_state:
+    st.session_state.feedback = None
+if 'quiz_job' not in st.session_state:
+    st.session_state.quiz_job = None
+if 'user_id' not in st.session_state:
+    # Kept in the URL so the user's history survives a reload
+    st.session_state.user_id = st.query_params.get("user") or uuid.uuid4().hex
+st.query_params["user"] = st.session_state.user_id
+
+# Initialize the engine once per server process
 @st.cache_resource
-def load_model():
-    return Ollama(model="llama3.2:latest")
+def load_engine():
+    """Model, quiz pool and caches shared by every session.
+    Set QUIZ_POOL_REFILL_WORKERS to refill the quiz pool in-process."""
+    return create_engine()
 
-@st.cache_data
-def load_pdf_content():
-    """Load PDF content directly"""
-    try:
-        from langchain_community.document_loaders.pdf import PyPDFDirectoryLoader
-        loader = PyPDFDirectoryLoader("nsrag/data")
-        documents = loader.load()
-        return "\n\n---\n\n".join([doc.page_content for doc in documents[:50]])  # Limit for performance
-    except:
-        # Fallback: use pre-loaded context (silently)
-        return """Network security covers cryptography, authentication, protocols, and security mechanisms.
-Key topics include: RSA encryption, symmetric/asymmetric encryption, hash functions, digital signatures,
-TLS/SSL protocols, key exchange mechanisms, and various attack vectors."""
+@st.cache_resource
+def load_quiz_jobs(_engine):
+    """Background quiz generation, polled by each session"""
+    return QuizJobs(_engine)
 
 try:
-    model = load_model()
-    pdf_content = load_pdf_content()
+    engine = load_engine()
+    quiz_jobs = load_quiz_jobs(engine)
+    history = engine.history
 except Exception as e:
     st.error(f"Error: {e}")
     st.stop()
 
-def parse_mcq_questions(text):
-    """Parse MCQ questions from text"""
-    questions = []
-    lines = text.strip().split('\n')
-    current_question = None
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        # Check if it's a question line
-        if line.startswith('Question') or (line[0].isdigit() and '.' in line[:3]):
-            if current_question:
-                questions.append(current_question)
-            current_question = {
-                'question': line.split(':', 1)[-1].strip() if ':' in line else line,
-                'options': []
-            }
-        # Check if it's an option
-        elif current_question and line and line[0] in ['A', 'B', 'C', 'D'] and (line[1] == ')' or line[1] == '.'):
-            option_text = line[2:].strip()
-            current_question['options'].append((line[0], option_text))
-    
-    if current_question and current_question['options']:
-        questions.append(current_question)
-    
-    return questions
-
-def parse_tf_questions(text):
-    """Parse True/False questions from text"""
-    questions = []
-    lines = text.strip().split('\n')
-    
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-            
-        # Check if it's a question line
-        if line.startswith('Question') or (line[0].isdigit() and '.' in line[:3]):
-            question_text = line.split(':', 1)[-1].strip() if ':' in line else line
-            # Remove question number if present
-            if question_text and question_text[0].isdigit():
-                question_text = question_text.split('.', 1)[-1].strip()
-            questions.append({
-                'question': question_text,
-                'options': [('True', 'True'), ('False', 'False')]
-            })
-    
-    return questions
-
-def export_quiz_results():
-    """Export quiz results to JSON"""
-    if st.session_state.quiz_history:
-        export_data = {
-            'total_quizzes': st.session_state.total_quizzes,
-            'total_questions': st.session_state.total_questions,
-            'total_correct': st.session_state.total_correct,
-            'accuracy': (st.session_state.total_correct / st.session_state.total_questions * 100) if st.session_state.total_questions > 0 else 0,
-            'quiz_history': st.session_state.quiz_history
-        }
-        return json.dumps(export_data, indent=2)
-    return None
+def display_question_preview(idx, q):
+    """Read-only question card shown while the quiz is still streaming"""
+    options = "".join(f"<div class='neutral-option'><strong>{letter})</strong> {text}</div>"
+                      for letter, text in q['options'])
+    st.markdown(f"""
+    <div class="question-card">
+        <div class="question-text">Question {idx + 1}: {q['question']}</div>
+    </div>
+    {options}
+    """, unsafe_allow_html=True)
+
+HISTORY_PAGE_SIZE = 20
+EXPORT_MIME_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+def export_quiz_results(fmt="ndjson"):
+    """Export the quiz history as NDJSON or CSV to a temporary file, read from the store in pages"""
+    if history.stats(st.session_state.user_id)['total_quizzes'] == 0:
+        return None
+    export_file = tempfile.TemporaryFile()
+    for part in history.iter_export(st.session_state.user_id, fmt):
+        export_file.write(part.encode("utf-8"))
+    export_file.seek(0)
+    return export_file
 
 def calculate_time_taken():
     """Calculate time taken for quiz"""
@@ -327,25 +283,17 @@ def calculate_time_taken():
         return int(time.time() - st.session_state.quiz_start_time)
     return 0
 
-def get_difficulty_context(difficulty):
-    """Get context modifier based on difficulty"""
-    if difficulty == "Easy":
-        return "Generate straightforward questions with clear, direct answers."
-    elif difficulty == "Hard":
-        return "Generate challenging questions that require deep understanding and critical thinking."
-    else:
-        return "Generate moderately challenging questions."
-
 def display_progress_stats():
-    """Display user progress statistics"""
-    if st.session_state.total_quizzes > 0:
-        accuracy = (st.session_state.total_correct / st.session_state.total_questions * 100) if st.session_state.total_questions > 0 else 0
+    """Display user progress statistics from the stored running totals"""
+    stats = history.stats(st.session_state.user_id)
+    if stats['total_quizzes'] > 0:
+        accuracy = stats['accuracy']
         
         col1, col2, col3 = st.columns(3)
         with col1:
             st.markdown(f"""
             <div class="stats-card">
-                <p class="stats-number">{st.session_state.total_quizzes}</p>
+                <p class="stats-number">{stats['total_quizzes']}</p>
                 <p class="stats-label">Quizzes Taken</p>
             </div>
             """, unsafe_allow_html=True)
@@ -353,7 +301,7 @@ def display_progress_stats():
         with col2:
             st.markdown(f"""
             <div class="stats-card">
-                <p class="stats-number">{st.session_state.total_correct}/{st.session_state.total_questions}</p>
+                <p class="stats-number">{stats['total_correct']}/{stats['total_questions']}</p>
                 <p class="stats-label">Correct Answers</p>
             </div>
             """, unsafe_allow_html=True)
@@ -366,6 +314,10 @@ def display_progress_stats():
             </div>
             """, unsafe_allow_html=True)
 
+        weakest = weakest_topics(history.mastery(st.session_state.user_id))
+        if weakest:
+            st.caption("Focus areas: " + ", ".join(f"{topic} ({score * 100:.0f}%)" for topic, score in weakest))
+
 def display_timer():
     """Display quiz timer"""
     if st.session_state.timer_enabled and st.session_state.quiz_start_time:
@@ -378,17 +330,6 @@ def display_timer():
         </div>
         """, unsafe_allow_html=True)
 
-# Topics list
-TOPICS = [
-    "OSI architecture", "Symmetric Encryption", "Rijndael", "Entropy",
-    "Pseudorandom Number Generator", "Block and Stream Ciphers", "RC4 Stream Cipher",
-    "Public-Key Cryptography", "RSA", "Homomorphic encryption",
-    "Message authentication", "Hash functions", "Secure Hash Function",
-    "Length Extension Attacks", "Message Authentication Code", "HMAC",
-    "Authenticated Encryption", "TLS 1.0 Lucky 13 Attack", "Digital Signatures",
-    "Hybrid Encryption", "Symmetric key distribution", "Diffie-Hellman Key Exchange"
-]
-
 # Header
 st.markdown("""
 <div class="main-header">
@@ -397,6 +338,8 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+user_stats = history.stats(st.session_state.user_id)
+
 # Sidebar
 with st.sidebar:
     st.markdown("### Navigation")
@@ -430,45 +373,59 @@ with st.sidebar:
         st.markdown("---")
         st.markdown("### Advanced Options")
         
+        adaptive = st.checkbox(
+            "Adapt to my progress", value=st.session_state.adaptive,
+            help="Favour your weakest topics and set the difficulty from your results on them"
+        )
+        st.session_state.adaptive = adaptive
+        
         difficulty = st.select_slider(
             "Difficulty Level",
             options=["Easy", "Medium", "Hard"],
             value=st.session_state.difficulty_level,
-            key="difficulty_selector"
+            key="difficulty_selector",
+            disabled=adaptive
         )
         st.session_state.difficulty_level = difficulty
         
         timer_enabled = st.checkbox("Enable Timer", value=st.session_state.timer_enabled)
         st.session_state.timer_enabled = timer_enabled
         
-        if st.session_state.quiz_history:
+        if user_stats['total_quizzes'] > 0:
             st.markdown("---")
             if st.button("Export Results"):
-                export_data = export_quiz_results()
-                if export_data:
-                    st.download_button(
-                        label="Download JSON",
-                        data=export_data,
-                        file_name=f"quiz_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                        mime="application/json"
-                    )
+                export_file = export_quiz_results()
+                if export_file:
+                    with export_file:
+                        st.download_button(
+                            label="Download NDJSON",
+                            data=export_file,
+                            file_name=f"quiz_results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.ndjson",
+                            mime=EXPORT_MIME_TYPES["ndjson"]
+                        )
             
             if st.button("Clear History"):
-                st.session_state.quiz_history = []
-                st.session_state.total_quizzes = 0
-                st.session_state.total_correct = 0
-                st.session_state.total_questions = 0
-                st.rerun()
+                if history.clear(st.session_state.user_id).saved(timeout=5):
+                    st.rerun()
+                st.error("Could not clear your history, please try again.")
     
     st.markdown("---")
     st.markdown("### Statistics")
     st.metric("Topics Available", len(TOPICS))
     st.metric("Model", "llama3.2")
     
-    if st.session_state.total_quizzes > 0:
-        accuracy = (st.session_state.total_correct / st.session_state.total_questions * 100) if st.session_state.total_questions > 0 else 0
-        st.metric("Overall Accuracy", f"{accuracy:.1f}%")
-        st.metric("Quizzes Completed", st.session_state.total_quizzes)
+    if user_stats['total_quizzes'] > 0:
+        st.metric("Overall Accuracy", f"{user_stats['accuracy']:.1f}%")
+        st.metric("Quizzes Completed", user_stats['total_quizzes'])
+    
+    queue_depth = metrics.gauge("llm_scheduler.queue_depth")
+    if queue_depth:
+        st.metric("Requests Waiting for Model", queue_depth)
+    
+    cache_hit_rate = metrics.hit_rate("answer_cache")
+    if page == "Ask Questions" and cache_hit_rate is not None:
+        st.metric("Answer Cache Hits", f"{cache_hit_rate:.0%}",
+                  help=f"{metrics.counter('answer_cache.hit')} hits, {metrics.counter('answer_cache.miss')} misses")
 
 # Main content
 if page == "Generate Quiz":
@@ -477,76 +434,75 @@ if page == "Generate Quiz":
     col1, col2 = st.columns([3, 1])
     
     with col1:
-        if st.button("Generate New Quiz", use_container_width=True):
-            with st.spinner("Generating quiz..."):
-                try:
-                    # Create prompt based on settings
-                    if st.session_state.topic_mode == "Random Topics":
-                        topics = random.sample(TOPICS, 2)
-                        topic_text = f"on the topics: {', '.join(topics)}"
-                    else:
-                        topic_text = f"on the topic: {st.session_state.selected_topic}"
-                    
-                    # Add difficulty context
-                    difficulty_context = get_difficulty_context(st.session_state.difficulty_level)
-                    
-                    if st.session_state.quiz_type == "Multiple Choice (MCQ)":
-                        prompt = f"""{difficulty_context}
-
-Based on network security concepts, generate {st.session_state.num_questions} multiple-choice questions {topic_text}.
-
-Each question should have:
-- A clear question
-- 4 options labeled A, B, C, D
-- DO NOT show the correct answer in the output
-
-Format:
-Question 1: [question text]
-A) [option]
-B) [option]
-C) [option]
-D) [option]
-
-Generate the quiz now (without showing correct answers):"""
-                    else:
-                        prompt = f"""Based on network security concepts, generate {st.session_state.num_questions} true/false questions {topic_text}.
-
-Format:
-Question 1: [statement]
-
-DO NOT show the answers. Generate the quiz now:"""
-                    
-                    # Use PDF content as context
-                    full_prompt = f"Context from network security materials:\n{pdf_content[:3000]}\n\n{prompt}"
-                    
-                    response = model.invoke(full_prompt)
-                    
-                    # Parse questions
-                    if st.session_state.quiz_type == "Multiple Choice (MCQ)":
-                        parsed = parse_mcq_questions(response)
-                    else:
-                        parsed = parse_tf_questions(response)
-                    
-                    st.session_state.quiz_data = {
-                        'questions': response,
-                        'type': st.session_state.quiz_type,
-                        'difficulty': st.session_state.difficulty_level,
-                        'topics': topics if st.session_state.topic_mode == "Random Topics" else [st.session_state.selected_topic]
-                    }
-                    st.session_state.parsed_questions = parsed
-                    st.session_state.user_answers = {}
-                    st.session_state.quiz_submitted = False
-                    st.session_state.correct_answers = {}
-                    
-                    # Initialize timer
-                    if st.session_state.timer_enabled:
-                        st.session_state.quiz_start_time = time.time()
-                    
-                    st.success("Quiz generated successfully!")
-                    st.rerun()
-                    
-                except Exception as e:
-                    st.error(f"Error: {e}")
+        if st.session_state.quiz_job is None and st.button("Generate New Quiz", use_container_width=True):
+            if st.session_state.topic_mode == "Random Topics":
+                topics = engine.pick_topics(
+                    user_id=st.session_state.user_id if st.session_state.adaptive else None
+                )
+            else:
+                topics = [st.session_state.selected_topic]
+            difficulty = st.session_state.difficulty_level
+            if st.session_state.adaptive:
+                difficulty = engine.pick_difficulty(st.session_state.user_id, topics, default=difficulty)
+            
+            # Generation runs in the background; this session polls the job
+            st.session_state.quiz_data = None
+            st.session_state.parsed_questions = []
+            st.session_state.quiz_saved = False
+            st.session_state.quiz_job = quiz_jobs.submit(
+                st.session_state.user_id,
+                topics,
+                st.session_state.quiz_type,
+                difficulty,
+                st.session_state.num_questions
+            )
+            st.rerun()
+        
+        job = quiz_jobs.get(st.session_state.quiz_job) if st.session_state.quiz_job else None
+        if st.session_state.quiz_job and job is None:
+            st.session_state.quiz_job = None
+        
+        if job and job['status'] not in FINISHED:
+            st.info(f"Generating quiz... {len(job['questions'])}/{job['num_questions']} questions ready")
+            if st.button("Cancel", use_container_width=True):
+                quiz_jobs.cancel(job['job_id'])
+            # Show each question as soon as it is complete
+            for idx, q in enumerate(job['questions']):
+                display_question_preview(idx, q)
+            time.sleep(1)
+            st.rerun()
+        
+        elif job and job['status'] == DONE:
+            quiz = job['quiz']
+            # Answers stay in the session; only the questions are rendered
+            public, answer_key = engine.split_answer_key(quiz['questions'])
+            st.session_state.quiz_data = {
+                'questions': format_questions(public),
+                'type': quiz['type'],
+                'difficulty': quiz['difficulty'],
+                'topics': quiz['topics'],
+                'context_results': quiz['context_results'],
+                'prompt_tokens': quiz['prompt_tokens']
+            }
+            st.session_state.parsed_questions = public
+            st.session_state.user_answers = {}
+            st.session_state.quiz_submitted = False
+            st.session_state.answer_key = answer_key
+            st.session_state.feedback = None
+            st.session_state.quiz_job = None
+            
+            # Initialize timer
+            if st.session_state.timer_enabled:
+                st.session_state.quiz_start_time = time.time()
+            
+            st.rerun()
+        
+        elif job:
+            st.session_state.quiz_job = None
+            if job['error']:
+                st.error(f"Error: {job['error']}")
+            else:
+                st.info("Quiz generation cancelled.")
     
     with col2:
         if st.session_state.quiz_data and not st.session_state.quiz_submitted:
@@ -560,6 +516,8 @@ DO NOT show the answers. Generate the quiz now:"""
         
         if not st.session_state.quiz_submitted:
             st.markdown("### Your Quiz")
+            if st.session_state.quiz_data.get('prompt_tokens'):
+                st.caption(f"Prompt size: {st.session_state.quiz_data['prompt_tokens']} tokens")
             
             # Display timer if enabled
             if st.session_state.timer_enabled:
@@ -605,58 +563,16 @@ DO NOT show the answers. Generate the quiz now:"""
                 st.markdown("<br>", unsafe_allow_html=True)
         
         else:
-            # Get correct answers first
-            if not st.session_state.correct_answers:
-                with st.spinner("Evaluating your answers..."):
-                    try:
-                        # Build answer string
-                        user_ans_str = ", ".join([f"{i+1}. {st.session_state.user_answers.get(i, 'No answer')}" 
-                                                  for i in range(len(st.session_state.parsed_questions))])
-                        
-                        eval_prompt = f"""You are a quiz evaluator. 
-
-Here are the quiz questions:
-{st.session_state.quiz_data['questions']}
-
-The user's answers are:
-{user_ans_str}
-
-For each question, provide ONLY:
-1. The correct answer (just the letter for MCQ or True/False)
-2. A brief explanation (one sentence)
-
-Format your response as:
-Question 1: Correct Answer: [X], Explanation: [brief explanation]
-Question 2: Correct Answer: [X], Explanation: [brief explanation]
-etc."""
-                        
-                        evaluation = model.invoke(eval_prompt)
-                        
-                        # Parse correct answers
-                        for idx, line in enumerate(evaluation.split('\n')):
-                            if 'Correct Answer:' in line:
-                                try:
-                                    correct = line.split('Correct Answer:')[1].split(',')[0].strip()
-                                    # Extract just the letter/answer
-                                    correct = correct.replace('[', '').replace(']', '').strip()
-                                    if correct and correct[0] in ['A', 'B', 'C', 'D', 'T', 'F']:
-                                        st.session_state.correct_answers[idx] = correct[0]
-                                except:
-                                    pass
-                    except Exception as e:
-                        st.error(f"Error: {e}")
+            # Grade locally against the answer key generated with the quiz
+            grade = engine.grade(st.session_state.answer_key, st.session_state.user_answers)
             
             # Display results with color coding
             st.markdown("### Quiz Results")
             
-            correct_count = 0
-            for idx, q in enumerate(st.session_state.parsed_questions):
-                user_answer = st.session_state.user_answers.get(idx, 'No answer')
-                correct_answer = st.session_state.correct_answers.get(idx, '?')
-                is_correct = user_answer == correct_answer
-                
-                if is_correct:
-                    correct_count += 1
+            for idx, (q, result) in enumerate(zip(st.session_state.parsed_questions, grade['results'])):
+                user_answer = result['user_answer'] or 'No answer'
+                correct_answer = result['correct_answer']
+                is_correct = result['is_correct']
                 
                 # Display question
                 st.markdown(f"""
@@ -686,11 +602,15 @@ etc."""
                     </div>
                     """, unsafe_allow_html=True)
                 
+                if result['explanation']:
+                    st.caption(result['explanation'])
+                
                 st.markdown("<br>", unsafe_allow_html=True)
             
             # Show score
-            total = len(st.session_state.parsed_questions)
-            percentage = (correct_count / total * 100) if total > 0 else 0
+            correct_count = grade['correct']
+            total = grade['total']
+            percentage = grade['percentage']
             time_taken = calculate_time_taken() if st.session_state.timer_enabled else None
             
             st.markdown("---")
@@ -704,7 +624,6 @@ etc."""
             # Save to history (only once)
             if 'quiz_saved' not in st.session_state or not st.session_state.quiz_saved:
                 quiz_record = {
-                    'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                     'type': st.session_state.quiz_data['type'],
                     'difficulty': st.session_state.quiz_data.get('difficulty', 'Medium'),
                     'topics': st.session_state.quiz_data.get('topics', []),
@@ -713,12 +632,29 @@ etc."""
                     'percentage': percentage,
                     'time_taken': time_taken
                 }
-                st.session_state.quiz_history.append(quiz_record)
-                st.session_state.total_quizzes += 1
-                st.session_state.total_questions += total
-                st.session_state.total_correct += correct_count
+                # Batched with other sessions' submissions; wait so the stats below include it
+                if not history.record(st.session_state.user_id, quiz_record).saved(timeout=5):
+                    st.warning("This result could not be saved to your history.")
                 st.session_state.quiz_saved = True
             
+            # Optional in-depth feedback; the score above needs no model call
+            if st.session_state.feedback is None:
+                if st.button("Get Detailed Feedback"):
+                    with st.spinner("Writing feedback..."):
+                        try:
+                            st.session_state.feedback = st.write_stream(engine.stream_feedback(
+                                st.session_state.quiz_data['type'],
+                                st.session_state.parsed_questions,
+                                st.session_state.user_answers,
+                                st.session_state.quiz_data.get('context_results', []),
+                                st.session_state.answer_key
+                            ))
+                        except Exception as e:
+                            st.error(f"Error: {e}")
+            else:
+                st.markdown("### Detailed Feedback")
+                st.markdown(st.session_state.feedback)
+            
             # Display overall progress
             st.markdown("---")
             display_progress_stats()
@@ -728,7 +664,8 @@ etc."""
                 st.session_state.parsed_questions = []
                 st.session_state.user_answers = {}
                 st.session_state.quiz_submitted = False
-                st.session_state.correct_answers = {}
+                st.session_state.answer_key = []
+                st.session_state.feedback = None
                 st.session_state.quiz_start_time = None
                 st.session_state.quiz_saved = False
                 st.rerun()
@@ -746,21 +683,18 @@ elif page == "Ask Questions":
     # Question input
     with st.form("question_form", clear_on_submit=True):
         question = st.text_input("Your question:", placeholder="e.g., What is RSA encryption?")
+        fresh_answer = st.checkbox("Fresh answer", help="Skip cached answers and ask the model again")
         submitted = st.form_submit_button("Ask", use_container_width=True)
         
         if submitted and question:
             with st.spinner("Thinking..."):
                 try:
-                    prompt = f"""Based on network security concepts, answer this question:
-
-Question: {question}
-
-Context from materials:
-{pdf_content[:2000]}
-
-Provide a clear, detailed answer:"""
+                    # Reuses the answer to the same or a paraphrased question
+                    answer = engine.stream_answer(question, fresh=fresh_answer)
                     
-                    answer = model.invoke(prompt)
+                    # Render the answer token by token
+                    st.markdown(f"**You:** {question}")
+                    answer = st.write_stream(answer.chunks)
                     st.session_state.chat_history.append((question, answer))
                     st.rerun()
                     
@@ -770,16 +704,40 @@ Provide a clear, detailed answer:"""
 elif page == "Quiz History":
     st.markdown("## Quiz History")
     
-    if st.session_state.quiz_history:
+    if user_stats['total_quizzes'] > 0:
         # Display overall stats
         display_progress_stats()
         
+        # Per-topic, per-difficulty and daily totals are precomputed by the store
+        st.markdown("---")
+        st.markdown("### Breakdown")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.markdown("**By topic**")
+            st.dataframe(history.rollup(st.session_state.user_id, "topic"), hide_index=True, use_container_width=True)
+        with col2:
+            st.markdown("**By difficulty**")
+            st.dataframe(history.rollup(st.session_state.user_id, "difficulty"), hide_index=True, use_container_width=True)
+        by_day = history.rollup(st.session_state.user_id, "day")
+        if len(by_day) > 1:
+            st.markdown("**Accuracy over time**")
+            st.line_chart(by_day, x="day", y="accuracy")
+        
         st.markdown("---")
         st.markdown("### Recent Quizzes")
         
+        # Cursors of the pages visited so far; the last one is the page shown
+        if 'history_cursors' not in st.session_state:
+            st.session_state.history_cursors = [None]
+        page_number = len(st.session_state.history_cursors) - 1
+        quizzes, next_cursor = history.page(
+            st.session_state.user_id, st.session_state.history_cursors[-1], HISTORY_PAGE_SIZE
+        )
+        
         # Display each quiz in history (most recent first)
-        for idx, quiz in enumerate(reversed(st.session_state.quiz_history)):
-            with st.expander(f"Quiz {len(st.session_state.quiz_history) - idx} - {quiz['date']} - Score: {quiz['percentage']:.1f}%"):
+        for idx, quiz in enumerate(quizzes):
+            quiz_number = user_stats['total_quizzes'] - page_number * HISTORY_PAGE_SIZE - idx
+            with st.expander(f"Quiz {quiz_number} - {quiz['date']} - Score: {quiz['percentage']:.1f}%"):
                 col1, col2 = st.columns(2)
                 
                 with col1:
@@ -806,30 +764,43 @@ elif page == "Quiz History":
                 </div>
                 """, unsafe_allow_html=True)
         
+        col1, col2 = st.columns(2)
+        with col1:
+            if page_number > 0 and st.button("← Newer", use_container_width=True):
+                st.session_state.history_cursors.pop()
+                st.rerun()
+        with col2:
+            if next_cursor and st.button("Older →", use_container_width=True):
+                st.session_state.history_cursors.append(next_cursor)
+                st.rerun()
+        
         # Export and clear options
         st.markdown("---")
         col1, col2 = st.columns(2)
         
         with col1:
-            export_data = export_quiz_results()
-            if export_data:
-                st.download_button(
-                    label="Export All Results",
-                    data=export_data,
-                    file_name=f"quiz_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json",
-                    mime="application/json",
-                    use_container_width=True
-                )
+            export_format = st.radio("Export format", ["ndjson", "csv"], horizontal=True)
+            # Built only on request, a large history is not read on every rerun
+            if st.button("Prepare Export", use_container_width=True):
+                export_file = export_quiz_results(export_format)
+                if export_file:
+                    with export_file:
+                        st.download_button(
+                            label="Export All Results",
+                            data=export_file,
+                            file_name=f"quiz_history_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{export_format}",
+                            mime=EXPORT_MIME_TYPES[export_format],
+                            use_container_width=True
+                        )
         
         with col2:
             if st.button("Clear All History", use_container_width=True):
                 if st.session_state.get('confirm_clear'):
-                    st.session_state.quiz_history = []
-                    st.session_state.total_quizzes = 0
-                    st.session_state.total_correct = 0
-                    st.session_state.total_questions = 0
                     st.session_state.confirm_clear = False
-                    st.rerun()
+                    if history.clear(st.session_state.user_id).saved(timeout=5):
+                        st.session_state.history_cursors = [None]
+                        st.rerun()
+                    st.error("Could not clear your history, please try again.")
                 else:
                     st.session_state.confirm_clear = True
                     st.warning("Click again to confirm deletion")